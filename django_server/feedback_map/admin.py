@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.utils.safestring import mark_safe
 from django.conf import settings
 from feedback_map import models
+from feedback_map.models.map_data_points import IMAGE_READY, image_variant_names
 
 
 admin.site.unregister(User)
@@ -16,11 +17,11 @@ class UserAdmin(UserAdmin):
 
 @admin.register(models.MapDataPoint)
 class MapDataPointAdmin(admin.ModelAdmin):
-    list_display = ['__str__', 'image__', 'lat', 'lon', 'created_at', 'created_by', 'modified_at', 'modified_by',
-                    'processed_by', 'visible']
+    list_display = ['__str__', 'image__', 'image_status', 'lat', 'lon', 'created_at', 'created_by', 'modified_at',
+                    'modified_by', 'processed_by', 'visible']
     search_fields = ['comment']
-    readonly_fields = ['image_', 'created_by', 'modified_by', 'processed_by']
-    list_filter = ['visible', 'created_by', 'processed_by']
+    readonly_fields = ['image_', 'image_status', 'created_by', 'modified_by', 'processed_by']
+    list_filter = ['visible', 'image_status', 'created_by', 'processed_by']
     date_hierarchy = 'created_at'
 
     def get_queryset(self, request):
@@ -29,7 +30,13 @@ class MapDataPointAdmin(admin.ModelAdmin):
     def image_(self, map_data_point):
         if not map_data_point.image:
             return 'No image.'
-        return mark_safe(f'<img src="{settings.MEDIA_URL}{map_data_point.image}" style="max-width: calc(100vw-260px); max-height: 60vh"/>')
+        if map_data_point.image_status == IMAGE_READY:
+            # Show a downscaled version, linking to the full size image:
+            preview = image_variant_names(map_data_point.image.name)[768]['jpeg']
+            return mark_safe(f'<a href="{settings.MEDIA_URL}{map_data_point.image}" target="_blank">'
+                             f'<img src="{settings.MEDIA_URL}{preview}" style="max-height: 60vh"/></a>')
+        return mark_safe(f'<img src="{settings.MEDIA_URL}{map_data_point.image}" '
+                         f'style="max-width: calc(100vw-260px); max-height: 60vh"/>')
 
     def image__(self, map_data_point):
         if not map_data_point.image:
@@ -50,3 +57,12 @@ class TagAdmin(admin.ModelAdmin):
     list_display = ['tag', 'color', 'published', 'button_position']
     list_editable = ['color', 'published', 'button_position']
     list_filter = ['published']
+
+
+@admin.register(models.OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'map_data_point', 'destination', 'created_at', 'attempts', 'next_attempt_at', 'sent_at', 'failed_at'
+    ]
+    list_filter = ['destination', 'sent_at', 'failed_at']
+    readonly_fields = ['map_data_point', 'payload', 'created_at']
@@ -0,0 +1,44 @@
+"""
+Minimal background task support: run work after the current transaction commits, off the request thread.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_TASK_WORKERS, thread_name_prefix="background")
+    return _executor
+
+
+def run_after_commit(func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs) once the current transaction commits, in a background thread if
+    BACKGROUND_TASK_WORKERS > 0 and in the committing thread otherwise. Tasks lost e.g. to a restart must be
+    recoverable from db state, see the process_images management command for an example.
+    """
+    transaction.on_commit(partial(run_task, func, *args, **kwargs))
+
+
+def run_task(func, *args, **kwargs):
+    if settings.BACKGROUND_TASK_WORKERS > 0:
+        get_executor().submit(run_in_thread, func, *args, **kwargs)
+    else:
+        func(*args, **kwargs)
+
+
+def run_in_thread(func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logging.exception(f"Background task {func.__name__} failed")
+    finally:
+        # Db connections are per thread; don't leave this one open:
+        connections.close_all()
@@ -0,0 +1,7 @@
+"""
+Synthetic-data benchmarks for the ReST API hot paths, run with the benchmark management command.
+"""
+from .data import generate_data, clear_data
+from .runner import run_benchmarks
+
+__all__ = ["generate_data", "clear_data", "run_benchmarks"]
@@ -0,0 +1,145 @@
+"""
+Generation of realistic looking map data points, comments, votes and tags around Helsinki.
+"""
+import random
+
+from django.contrib.auth.models import Group, User
+from django.contrib.gis.geos import Point
+from django.db import connection, transaction
+
+from feedback_map import models
+from feedback_map.models.map_data_points import STATUS_CHOICES
+from feedback_map.rest.permissions import REVIEWER_GROUP
+from feedback_map.tag_registry import tag_registry
+
+# All generated notes carry this device id, so they can be told apart from real ones and cleared afterwards:
+BENCHMARK_DEVICE_ID = "benchmark"
+BENCHMARK_USERNAME_PREFIX = "benchmark-"
+BENCHMARK_TAGS = [f"benchmark-{name}" for name in ["pothole", "bench", "lighting", "snow", "litter", "sign", "bike"]]
+
+# Roughly the Helsinki capital region:
+LAT_RANGE = (60.10, 60.30)
+LON_RANGE = (24.75, 25.25)
+# Notes cluster around a few hot spots, like the real ones do:
+HOT_SPOTS = [(60.1699, 24.9384), (60.1841, 24.9511), (60.2055, 24.6559), (60.2934, 25.0378), (60.1587, 24.8792)]
+
+COMMENTS_PER_NOTE = 0.5
+VOTES_PER_NOTE = 2
+USER_COUNT = 100
+
+WORDS = (
+    "the bike lane is blocked by snow and a broken bench near the bus stop needs fixing soon please "
+    "street light has been out for a week pothole on the crossing is dangerous for cyclists"
+).split()
+
+
+def random_location(rng):
+    if rng.random() < 0.7:
+        lat, lon = rng.choice(HOT_SPOTS)
+        lat, lon = rng.gauss(lat, 0.01), rng.gauss(lon, 0.02)
+    else:
+        lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+    return round(lat, 8), round(lon, 8)
+
+
+def random_text(rng, max_words=20):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, max_words))).capitalize()
+
+
+def get_benchmark_user():
+    """
+    Return the reviewer the benchmarks make their requests as.
+    """
+    user, _created = User.objects.get_or_create(username=f"{BENCHMARK_USERNAME_PREFIX}reviewer")
+    user.groups.add(Group.objects.get_or_create(name=REVIEWER_GROUP)[0])
+    return user
+
+
+def generate_data(count, batch_size=10000, seed=0, stdout=None):
+    """
+    Create `count` visible map data points with comments, votes and tags, in batches of `batch_size`. Calling this
+    repeatedly adds more data.
+    """
+    rng = random.Random(seed)
+    for position, tag in enumerate(BENCHMARK_TAGS, start=1):
+        models.Tag.objects.get_or_create(tag=tag, defaults={"button_position": position})
+    tag_registry.invalidate()
+
+    reviewer = get_benchmark_user()
+    users = [reviewer] + [
+        User.objects.get_or_create(username=f"{BENCHMARK_USERNAME_PREFIX}{i}")[0] for i in range(USER_COUNT)
+    ]
+
+    created = 0
+    while created < count:
+        with transaction.atomic():
+            notes = []
+            for _ in range(min(batch_size, count - created)):
+                lat, lon = random_location(rng)
+                point = Point(lon, lat, srid=4326)
+                user = rng.choice(users)
+                notes.append(
+                    models.MapDataPoint(
+                        lat=lat,
+                        lon=lon,
+                        geom=point,
+                        geog=point,
+                        comment=random_text(rng),
+                        tags=rng.sample(BENCHMARK_TAGS, rng.randint(0, 2)),
+                        status=rng.choice(STATUS_CHOICES)[0],
+                        device_id=BENCHMARK_DEVICE_ID,
+                        created_by=user,
+                        modified_by=user,
+                    )
+                )
+            models.MapDataPoint.objects.bulk_create(notes)
+
+            comments = [
+                models.MapDataPointComment(
+                    map_data_point=rng.choice(notes), user=rng.choice(users), comment=random_text(rng, 40)
+                )
+                for _ in range(int(len(notes) * COMMENTS_PER_NOTE))
+            ]
+            models.MapDataPointComment.objects.bulk_create(comments)
+            # Give the reviewer something to read in the notifications:
+            models.MapDataPointCommentNotification.objects.bulk_create(
+                [
+                    models.MapDataPointCommentNotification(comment=comment, user=reviewer)
+                    for comment in comments
+                    if comment.user != reviewer
+                ]
+            )
+
+            votes = {(rng.choice(notes).id, rng.choice(users).id) for _ in range(len(notes) * VOTES_PER_NOTE)}
+            upvotes, downvotes = [], []
+            for note_id, user_id in votes:
+                if rng.random() < 0.8:
+                    upvotes.append(models.MapDataPointUpvote(map_data_point_id=note_id, user_id=user_id))
+                else:
+                    downvotes.append(models.MapDataPointDownvote(map_data_point_id=note_id, user_id=user_id))
+            models.MapDataPointUpvote.objects.bulk_create(upvotes)
+            models.MapDataPointDownvote.objects.bulk_create(downvotes)
+
+            # Spread creation times over the past year; auto_now_add leaves no way to set them on create:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE feedback_map_mapdatapoint "
+                    "SET created_at = now() - random() * interval '365 days', modified_at = now() "
+                    "WHERE id = ANY(%s)",
+                    [[note.id for note in notes]],
+                )
+        created += len(notes)
+        if stdout:
+            stdout.write(f"Created {created}/{count} map data points.")
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE feedback_map_mapdatapoint")
+
+
+def clear_data():
+    """
+    Delete all generated benchmark data.
+    """
+    models.MapDataPoint.objects.filter(device_id=BENCHMARK_DEVICE_ID).delete()
+    models.Tag.objects.filter(tag__in=BENCHMARK_TAGS).delete()
+    User.objects.filter(username__startswith=BENCHMARK_USERNAME_PREFIX).delete()
+    tag_registry.invalidate()
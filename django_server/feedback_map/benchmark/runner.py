@@ -0,0 +1,142 @@
+"""
+Timing of the main ReST API endpoints against the data in the database.
+"""
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import time
+
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from feedback_map import models
+from .data import BENCHMARK_DEVICE_ID, HOT_SPOTS, get_benchmark_user
+from .serialization import time_serialization
+
+
+def percentile(values, percent):
+    """
+    Return the nearest-rank percentile of the given values.
+    """
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def iotdevice_payload(rng):
+    lat, lon = rng.choice(HOT_SPOTS)
+    return json.dumps(
+        {
+            "deveui": BENCHMARK_DEVICE_ID,
+            "latitude": str(int(lat / 256.0 * 10**7)),
+            "longitude": str(int(lon / 256.0 * 10**7)),
+            "time": str(int(time.time())),
+            "button": "1",
+            "buttons": "8",
+        }
+    )
+
+
+def scenarios(rng, note_ids):
+    """
+    Return {name: function returning a (method, path, kwargs) request} for each benchmarked endpoint.
+    """
+    lat, lon = HOT_SPOTS[0]
+    bbox = f"{lon - 0.01},{lat - 0.005},{lon + 0.01},{lat + 0.005}"
+    return {
+        "list": lambda: ("get", "/rest/map_data_points/", {}),
+        "list_bbox": lambda: ("get", "/rest/map_data_points/", {"data": {"bbox": bbox}}),
+        "list_coordinates": lambda: (
+            "get",
+            "/rest/map_data_points/",
+            {"data": {"coordinates": f"{lat},{lon},500"}},
+        ),
+        "geojson": lambda: ("get", "/rest/map_data_points.geojson", {}),
+        "geojson_bbox": lambda: ("get", "/rest/map_data_points.geojson", {"data": {"bbox": bbox}}),
+        "detail": lambda: ("get", f"/rest/map_data_points/{rng.choice(note_ids)}/", {}),
+        "comments": lambda: ("get", "/rest/map_data_point_comments/", {}),
+        "notifications": lambda: ("get", "/rest/notifications/", {}),
+        "iotdevice": lambda: (
+            "post",
+            "/rest/iotdevice",
+            {
+                "data": iotdevice_payload(rng),
+                "content_type": "application/json",
+                "HTTP_TOKEN": os.getenv("IOTDEVICE_TOKEN"),
+            },
+        ),
+    }
+
+
+def time_scenario(client, make_request, repeat, warmup):
+    durations, query_counts, statuses = [], [], set()
+    for i in range(warmup + repeat):
+        method, path, kwargs = make_request()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            # Consume streaming responses, so that the time includes producing the whole body:
+            if response.streaming:
+                b"".join(response.streaming_content)
+            duration = time.perf_counter() - start
+        if i >= warmup:
+            durations.append(duration * 1000)
+            query_counts.append(len(queries))
+            statuses.add(response.status_code)
+    return {
+        "p50_ms": round(percentile(durations, 50), 3),
+        "p95_ms": round(percentile(durations, 95), 3),
+        "p99_ms": round(percentile(durations, 99), 3),
+        "queries": max(query_counts),
+        "status": sorted(statuses),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(repeat=50, warmup=5, only=None, seed=0):
+    """
+    Time each endpoint `repeat` times after `warmup` untimed requests, and return the results as a dict ready to be
+    dumped as JSON. Latencies are in milliseconds and peak RSS of the process in kilobytes. The throughput of list
+    serialization and rendering is measured separately.
+    """
+    rng = random.Random(seed)
+    # The IoT device endpoint checks the token from the environment on each request:
+    os.environ.setdefault("IOTDEVICE_TOKEN", "benchmark")
+    notes = models.MapDataPoint.objects.filter(visible=True, device_id=BENCHMARK_DEVICE_ID)
+    id_range = notes.aggregate(first=Min("id"), last=Max("id"))
+    if id_range["first"] is None:
+        raise ValueError("No benchmark data found, generate some first")
+    # Sample detail ids without sorting the whole table:
+    candidates = [rng.randint(id_range["first"], id_range["last"]) for _ in range(1000)]
+    note_ids = list(notes.filter(id__in=candidates).values_list("id", flat=True)) or [id_range["first"]]
+
+    client = Client(HTTP_HOST="localhost")
+    client.force_login(get_benchmark_user())
+
+    results = {}
+    for name, make_request in scenarios(rng, note_ids).items():
+        if only and name not in only:
+            continue
+        results[name] = time_scenario(client, make_request, repeat, warmup)
+        results[name]["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "commit": git_commit(),
+        "timestamp": timezone.now().isoformat(),
+        "map_data_points": models.MapDataPoint.objects.count(),
+        "repeat": repeat,
+        "scenarios": results,
+        "serialization": time_serialization(repeat=max(1, min(repeat, 10))),
+    }
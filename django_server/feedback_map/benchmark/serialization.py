@@ -0,0 +1,53 @@
+"""
+Throughput of the list serialization and JSON rendering, without the db and HTTP overhead.
+"""
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from feedback_map import models
+from feedback_map.rest.renderers import ORJSONRenderer
+from feedback_map.rest.serializers import BaseMapDataPointSerializer, DictMapDataPointSerializer
+
+
+def generic_representation(serializer, note):
+    """
+    Serialize a note with DRF's field-by-field machinery, as DictMapDataPointSerializer did before its fast path.
+    """
+    result = BaseMapDataPointSerializer.to_representation(serializer, note)
+    for field in serializer.false_default_fields:
+        result.setdefault(field, False)
+    return result
+
+
+def rows_per_second(func, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return round(len(rows) / best) if best else None
+
+
+def time_serialization(count=1000, repeat=5):
+    """
+    Return rows per second serialized with the generic and the fast path, and rendered with JSONRenderer and
+    ORJSONRenderer, using up to `count` visible notes from the db.
+    """
+    rows = list(models.MapDataPoint.objects.filter(visible=True).values()[:count])
+    if not rows:
+        return {"rows": 0}
+    serializer = DictMapDataPointSerializer()
+    data = [serializer.to_representation(row) for row in rows]
+    return {
+        "rows": len(rows),
+        "generic_serializer_rows_per_s": rows_per_second(
+            lambda rows: [generic_representation(serializer, row) for row in rows], rows, repeat
+        ),
+        "fast_serializer_rows_per_s": rows_per_second(
+            lambda rows: [serializer.to_representation(row) for row in rows], rows, repeat
+        ),
+        "json_renderer_rows_per_s": rows_per_second(JSONRenderer().render, data, repeat),
+        "orjson_renderer_rows_per_s": rows_per_second(ORJSONRenderer().render, data, repeat),
+    }
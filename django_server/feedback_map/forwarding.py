@@ -0,0 +1,183 @@
+"""
+Forwarding of map data point changes to Kafka and the external IoT feedback API through the transactional outbox.
+"""
+import json
+import logging
+import os
+from datetime import timedelta
+
+import httpx
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from feedback_map.models import OutboxMessage
+
+_producer = None
+
+
+def get_kafka_producer():
+    """
+    Return a Kafka producer connected to KAFKA_BOOTSTRAP_SERVERS, or None if Kafka is not configured. The producer
+    is created on first use and lives for the duration of the process.
+    """
+    global _producer
+    if _producer is None and os.getenv("KAFKA_BOOTSTRAP_SERVERS"):
+        from kafka import KafkaProducer
+
+        try:
+            _producer = KafkaProducer(
+                bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS", "").split(","),
+                security_protocol=os.getenv("KAFKA_SECURITY_PROTOCOL", "PLAINTEXT"),
+                ssl_cafile=os.getenv("KAFKA_SSL_CA_LOCATION"),
+                ssl_certfile=os.getenv("KAFKA_ACCESS_CERT"),
+                ssl_keyfile=os.getenv("KAFKA_ACCESS_KEY"),
+                sasl_mechanism=os.getenv("KAFKA_SASL_MECHANISMS"),
+                sasl_plain_username=os.getenv("KAFKA_SASL_USERNAME"),
+                sasl_plain_password=os.getenv("KAFKA_SASL_PASSWORD"),
+            )
+            logging.info("Kafka producer successfully connected to {}.".format(os.getenv("KAFKA_BOOTSTRAP_SERVERS")))
+        except Exception as e:
+            logging.critical(f"Kafka producer failed to connect. {e}")
+            raise
+    return _producer
+
+
+def map_data_point_payload(instance):
+    # serialize instance to json using Django's serializer, this will take care of datetime and other types
+    data = json.loads(serializers.serialize("json", [instance]))[0]
+    # create a dict with the fields we want to forward
+    keys = ["created_at", "modified_at", "image", "comment", "device_id"]
+    payload = {"id": instance.id}
+    for key in keys:
+        payload[key] = data["fields"][key]
+    for key in ["lat", "lon"]:
+        payload[key] = float(data["fields"][key])
+    payload["tags"] = json.loads(data["fields"]["tags"])
+    return payload
+
+
+def outbox_messages_for(instance, created):
+    """
+    Return unsaved OutboxMessages forwarding the current state of the given map data point.
+    """
+    payload = map_data_point_payload(instance)
+    messages = []
+    if settings.IOT_FEEDBACK_API_URL:
+        messages.append(OutboxMessage(map_data_point=instance, destination="http", payload=payload))
+    if created and os.getenv("KAFKA_BOOTSTRAP_SERVERS") and os.getenv("KAFKA_FORWARD_TOPIC_NAME"):
+        messages.append(OutboxMessage(map_data_point=instance, destination="kafka", payload=payload))
+    return messages
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(2**attempts, settings.OUTBOX_MAX_RETRY_DELAY))
+
+
+def forward_pending_messages(batch_size=100, http_client=None):
+    """
+    Send a batch of due outbox messages, oldest first, and return the number of messages processed.
+
+    Only the oldest unsent message of each map data point and destination is eligible, so changes to a note are
+    always delivered in order, also when several forwarders run concurrently. Failed messages are retried with
+    exponential backoff, up to OUTBOX_MAX_ATTEMPTS times.
+
+    The batch is claimed in a short transaction by leasing it to this forwarder, i.e. postponing its next attempt for
+    as long as sending it may take, and sent without holding any locks. If the forwarder dies while sending, the batch
+    is retried once the lease runs out.
+    """
+    now = timezone.now()
+    messages = claim_messages(batch_size, now)
+    if not messages:
+        return 0
+
+    client = http_client or httpx.Client(timeout=settings.FORWARD_TIMEOUT)
+    kafka_futures = []
+    try:
+        for message in messages:
+            try:
+                if message.destination == "http":
+                    client.post(settings.IOT_FEEDBACK_API_URL, json=message.payload).raise_for_status()
+                    message.sent_at = timezone.now()
+                elif message.destination == "kafka":
+                    kafka_futures.append((message, send_to_kafka(message)))
+            except Exception as e:
+                record_failure(message, e, timezone.now())
+    finally:
+        if http_client is None:
+            client.close()
+
+    if kafka_futures:
+        get_kafka_producer().flush(timeout=settings.FORWARD_TIMEOUT)
+        for message, future in kafka_futures:
+            try:
+                future.get(timeout=0)
+                message.sent_at = timezone.now()
+            except Exception as e:
+                record_failure(message, e, timezone.now())
+
+    with transaction.atomic():
+        OutboxMessage.objects.bulk_update(
+            messages, ["sent_at", "failed_at", "attempts", "next_attempt_at", "last_error"]
+        )
+    return len(messages)
+
+
+def claim_messages(batch_size, now) -> list:
+    """
+    Lease a batch of due messages to the calling forwarder and return them.
+    """
+    earlier_unsent = OutboxMessage.objects.filter(
+        map_data_point=OuterRef("map_data_point"),
+        destination=OuterRef("destination"),
+        sent_at__isnull=True,
+        failed_at__isnull=True,
+        id__lt=OuterRef("id"),
+    )
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.filter(sent_at__isnull=True, failed_at__isnull=True, next_attempt_at__lte=now)
+            .filter(~Exists(earlier_unsent))
+            .select_for_update(skip_locked=True)
+            .order_by("id")[:batch_size]
+        )
+        if messages:
+            # Long enough for every message to time out, and the Kafka flush after them:
+            lease_until = now + timedelta(seconds=settings.FORWARD_TIMEOUT * (len(messages) + 1) + 60)
+            OutboxMessage.objects.filter(id__in=[message.id for message in messages]).update(
+                next_attempt_at=lease_until
+            )
+    return messages
+
+
+def prune_sent_messages() -> int:
+    """
+    Delete the messages sent more than OUTBOX_RETENTION_DAYS ago, and return the number of messages deleted.
+    """
+    sent_before = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxMessage.objects.filter(sent_at__lt=sent_before).delete()
+    return deleted
+
+
+def send_to_kafka(message):
+    producer = get_kafka_producer()
+    if producer is None:
+        raise RuntimeError("Kafka is not configured")
+    pl_bytes = json.dumps(message.payload, sort_keys=True).encode("utf-8")
+    topic = os.getenv("KAFKA_FORWARD_TOPIC_NAME")
+    logging.info(f"Sending {pl_bytes} to Kafka topic {topic}")
+    # Key by note id so that changes to a note end up in the same partition and stay in order:
+    return producer.send(topic, pl_bytes, key=str(message.map_data_point_id).encode("utf-8"))
+
+
+def record_failure(message, error, now):
+    message.attempts += 1
+    message.last_error = str(error)
+    if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        logging.error(f"Forwarding {message} to {message.destination} failed for good: {error}")
+        message.failed_at = now
+    else:
+        logging.warning(f"Forwarding {message} to {message.destination} failed: {error}")
+        message.next_attempt_at = now + retry_delay(message.attempts)
@@ -0,0 +1,111 @@
+"""
+Processing of images uploaded to map data points, run in the background once per uploaded image.
+"""
+import logging
+from io import BytesIO
+
+from PIL import Image as Img, ExifTags
+from django.core.files.base import ContentFile
+
+from feedback_map import tile_cache
+from feedback_map.models import MapDataPoint
+from feedback_map.models.map_data_points import (
+    IMAGE_PENDING,
+    IMAGE_PROCESSING,
+    IMAGE_READY,
+    IMAGE_FAILED,
+    IMAGE_VARIANT_FORMATS,
+    image_variant_names,
+)
+
+
+def process_image(map_data_point_id):
+    """
+    Process the pending image of the given map data point. The note is claimed by switching its image_status to
+    processing first, so each uploaded image is processed exactly once even if several workers pick it up.
+    """
+    claimed = MapDataPoint.objects.filter(id=map_data_point_id, image_status=IMAGE_PENDING).update(
+        image_status=IMAGE_PROCESSING
+    )
+    if not claimed:
+        return
+    map_data_point = MapDataPoint.objects.get(id=map_data_point_id)
+    try:
+        pilImage = apply_exif_orientation(map_data_point)
+        generate_variants(map_data_point, pilImage)
+        image_status = IMAGE_READY
+    except Exception:
+        logging.exception(f"Processing image of {map_data_point!r} failed")
+        image_status = IMAGE_FAILED
+    # Use update() rather than save() to leave the rest of the note, and its modification time, untouched. If a new
+    # image was uploaded meanwhile, the note is pending again and is left for the next run.
+    MapDataPoint.objects.filter(id=map_data_point_id, image_status=IMAGE_PROCESSING).update(image_status=image_status)
+    tile_cache.invalidate_notes([map_data_point])
+
+
+def process_pending_images(batch_size=100):
+    """
+    Process a batch of pending images and return the number of images processed.
+    """
+    ids = list(
+        MapDataPoint.objects.filter(image_status=IMAGE_PENDING).order_by("id").values_list("id", flat=True)[:batch_size]
+    )
+    for map_data_point_id in ids:
+        process_image(map_data_point_id)
+    return len(ids)
+
+
+def apply_exif_orientation(map_data_point):
+    """
+    Rotate the image of the given map data point according to its EXIF orientation, if any. Return the image as
+    displayed.
+    """
+    with map_data_point.image.open("rb") as file:
+        pilImage = Img.open(BytesIO(file.read()))
+
+    for orientation in ExifTags.TAGS.keys():
+        if ExifTags.TAGS[orientation] == "Orientation":
+            break
+
+    exif = pilImage.getexif()
+    orientation = exif.get(orientation, None)
+    if not orientation:
+        return pilImage
+
+    if orientation == 3:
+        pilImage = pilImage.rotate(180, expand=True)
+    elif orientation == 6:
+        pilImage = pilImage.rotate(270, expand=True)
+    elif orientation == 8:
+        pilImage = pilImage.rotate(90, expand=True)
+    else:
+        return pilImage
+
+    output = BytesIO()
+    pilImage = pilImage.convert("RGB")
+    pilImage.save(output, format="JPEG", quality=75)
+    name = map_data_point.image.name
+    saved_name = replace_file(map_data_point.image.storage, name, output.getvalue())
+    if saved_name != name:
+        MapDataPoint.objects.filter(id=map_data_point.id).update(image=saved_name)
+        map_data_point.image.name = saved_name
+    return pilImage
+
+
+def generate_variants(map_data_point, pilImage):
+    """
+    Store downscaled WebP and JPEG versions of the image of the given map data point for responsive display.
+    """
+    storage = map_data_point.image.storage
+    for size, names in image_variant_names(map_data_point.image.name).items():
+        variant = pilImage.convert("RGB")
+        variant.thumbnail((size, size))
+        for extension, name in names.items():
+            output = BytesIO()
+            variant.save(output, format=IMAGE_VARIANT_FORMATS[extension], quality=75)
+            replace_file(storage, name, output.getvalue())
+
+
+def replace_file(storage, name, content):
+    storage.delete(name)
+    return storage.save(name, ContentFile(content))
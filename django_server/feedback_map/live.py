@@ -0,0 +1,254 @@
+"""
+Live feed of note changes for map clients as Server-Sent Events, served by the ASGI application.
+
+A trigger on feedback_map_mapdatapoint sends a NOTIFY on NOTIFY_CHANNEL for every created, updated, hidden and deleted
+note, except for updates of nothing but the vote counts, see migrations 0017 and 0018. Each ASGI process LISTENs on a
+single db connection while it has clients connected, and fans the notifications out to the clients, filtering them by
+the bbox each client subscribed to.
+
+A client that falls too far behind is disconnected. Clients should catch up with the `changes` endpoint after
+(re)connecting, using the id of the last event received as the `since` token.
+"""
+import asyncio
+import json
+import logging
+from typing import Optional
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from rest_framework.exceptions import ValidationError
+
+from feedback_map import models
+from feedback_map.rest.renderers import dumps
+from feedback_map.rest.serializers import DictMapDataPointSerializer
+from feedback_map.rest.views.map_data_points import create_polygon_or_fail
+
+NOTIFY_CHANNEL = "feedback_map_notes"
+LIVE_NOTES_PATH = "/rest/map_data_points/live/"
+KEEPALIVE_INTERVAL = 15
+MAX_PENDING_EVENTS = 1000
+# Events that carry the current state of the note, rather than just its id:
+NOTE_EVENTS = ["created", "updated"]
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    # Don't let nginx buffer the stream:
+    (b"x-accel-buffering", b"no"),
+]
+
+
+def server_sent_event(event: str, data: bytes, event_id=None) -> bytes:
+    lines = [f"event: {event}".encode()]
+    if event_id is not None:
+        lines.append(f"id: {event_id}".encode())
+    lines.append(b"data: " + data)
+    return b"\n".join(lines) + b"\n\n"
+
+
+def fetch_notes(ids) -> dict:
+    """
+    Return the visible ones of the given notes serialized like in the list, by id.
+    """
+    serializer = DictMapDataPointSerializer()
+    notes = models.MapDataPoint.objects.filter(id__in=ids, visible=True).values(*serializer.columns())
+    return {note["id"]: serializer.to_representation(note) for note in notes}
+
+
+def listen_connection(channel):
+    """
+    Open a new db connection, separate from Django's connection handling, listening to the given channel.
+    """
+    wrapper = connections[DEFAULT_DB_ALIAS]
+    connection = wrapper.get_new_connection(wrapper.get_connection_params())
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {channel}")
+    return connection
+
+
+class Subscription:
+    """
+    The pending events of one connected client. An event of None tells the client to disconnect.
+    """
+
+    def __init__(self, bbox: Optional[tuple] = None):
+        # (min_lon, min_lat, max_lon, max_lat), or None for all notes
+        self.bbox = bbox
+        self.events = asyncio.Queue(MAX_PENDING_EVENTS)
+
+    def wants(self, change) -> bool:
+        if self.bbox is None:
+            return True
+        positions = [(change["lon"], change["lat"])]
+        if change.get("moved_from"):
+            positions.append(change["moved_from"])
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        return any(min_lon <= lon <= max_lon and min_lat <= lat <= max_lat for lon, lat in positions)
+
+    def send(self, event: bytes):
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            logging.warning("Disconnecting a live feed client that is too slow")
+            self.close()
+
+    def close(self):
+        while not self.events.empty():
+            self.events.get_nowait()
+        self.events.put_nowait(None)
+
+
+class NoteFeed:
+    """
+    Fans out the note change notifications received on one LISTEN connection to the subscriptions of this process.
+    """
+
+    def __init__(self, channel=NOTIFY_CHANNEL):
+        self.channel = channel
+        self.subscriptions = set()
+        self.connection = None
+        self.notifications = None
+        self.publisher = None
+        self._lock = None
+
+    async def subscribe(self, bbox=None) -> Subscription:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.connection is None:
+                await self.listen()
+        subscription = Subscription(bbox)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions:
+            self.stop()
+
+    async def listen(self):
+        self.connection = await sync_to_async(listen_connection, thread_sensitive=False)(self.channel)
+        self.notifications = asyncio.Queue()
+        asyncio.get_running_loop().add_reader(self.connection.fileno(), self.receive)
+        self.publisher = asyncio.create_task(self.publish_notifications())
+
+    def stop(self):
+        if self.connection is not None:
+            asyncio.get_running_loop().remove_reader(self.connection.fileno())
+            self.connection.close()
+            self.connection = None
+        if self.publisher is not None:
+            self.publisher.cancel()
+            self.publisher = None
+
+    def receive(self):
+        try:
+            self.connection.poll()
+        except Exception:
+            logging.exception("Live feed lost its db connection")
+            self.stop()
+            # Clients will reconnect and catch up with the changes endpoint:
+            for subscription in self.subscriptions:
+                subscription.close()
+            self.subscriptions.clear()
+            return
+        changes = []
+        while self.connection.notifies:
+            changes.append(json.loads(self.connection.notifies.pop(0).payload))
+        if changes:
+            self.notifications.put_nowait(changes)
+
+    async def publish_notifications(self):
+        while True:
+            changes = await self.notifications.get()
+            # Publish everything received meanwhile in one go, to fetch the notes with one query:
+            while not self.notifications.empty():
+                changes += self.notifications.get_nowait()
+            try:
+                # Like at the start of a request, as the connection used for fetching the notes is long lived:
+                await sync_to_async(close_old_connections)()
+                await self.publish(changes)
+            except Exception:
+                logging.exception("Publishing note changes to the live feed failed")
+
+    async def publish(self, changes):
+        """
+        Send the given changes to the subscriptions that want them, in order.
+        """
+        subscriptions = list(self.subscriptions)
+        recipients = [(change, [s for s in subscriptions if s.wants(change)]) for change in changes]
+        note_ids = {change["id"] for change, wanting in recipients if wanting and change["event"] in NOTE_EVENTS}
+        notes = await sync_to_async(fetch_notes)(note_ids) if note_ids else {}
+
+        for change, wanting in recipients:
+            if not wanting:
+                continue
+            if change["event"] in NOTE_EVENTS:
+                data = notes.get(change["id"])
+                if data is None:
+                    # Hidden or deleted since, and there is an event for that later on
+                    continue
+            else:
+                data = {"id": change["id"]}
+            event = server_sent_event(change["event"], dumps(data), change.get("change_seq"))
+            for subscription in wanting:
+                subscription.send(event)
+
+
+note_feed = NoteFeed()
+
+
+async def respond(send, status: int, body: bytes):
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def live_notes(scope, receive, send, feed=note_feed):
+    """
+    ASGI application streaming note changes as Server-Sent Events: `created` and `updated` events with the note in
+    the same format as the list, and `hidden` and `deleted` events with just the id of the note. Use e.g.
+    `?bbox=24.95,60.165,24.96,60.175` to only receive changes to notes within (or moved out of) the bbox.
+    """
+    if scope["method"] != "GET":
+        await respond(send, 405, b"Method not allowed")
+        return
+    bbox = parse_qs(scope["query_string"].decode("latin-1")).get("bbox", [""])[0]
+    try:
+        bbox = create_polygon_or_fail(bbox).extent if bbox else None
+    except ValidationError as e:
+        await respond(send, 400, str(e.detail[0]).encode())
+        return
+
+    subscription = await feed.subscribe(bbox)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    next_event = None
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+        while True:
+            next_event = next_event or asyncio.ensure_future(subscription.events.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected}, timeout=KEEPALIVE_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                return
+            if next_event in done:
+                body, next_event = next_event.result(), None
+                if body is None:
+                    break
+            else:
+                body = b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        if next_event is not None:
+            next_event.cancel()
+        feed.unsubscribe(subscription)
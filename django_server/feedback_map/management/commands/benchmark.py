@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from feedback_map.benchmark import clear_data, generate_data, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main ReST API endpoints against synthetic map data points and print p50/p95/p99 latencies, "
+        "query counts and peak RSS as JSON. Don't run this against a production database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--generate", type=int, default=0, help="Number of map data points to generate first")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Number of map data points per insert")
+        parser.add_argument("--repeat", type=int, default=50, help="Number of timed requests per endpoint")
+        parser.add_argument("--warmup", type=int, default=5, help="Number of untimed requests per endpoint")
+        parser.add_argument("--only", nargs="+", help="Names of the endpoints to time, e.g. list_bbox detail")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for data and requests")
+        parser.add_argument("--output", help="Write the results to this file instead of stdout")
+        parser.add_argument("--clear", action="store_true", help="Delete the generated data afterwards")
+
+    def handle(self, *args, generate, batch_size, repeat, warmup, only, seed, output, clear, **options):
+        if generate:
+            generate_data(generate, batch_size=batch_size, seed=seed, stdout=self.stderr)
+        try:
+            results = run_benchmarks(repeat=repeat, warmup=warmup, only=only, seed=seed)
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if clear:
+                clear_data()
+
+        report = json.dumps(results, indent=2)
+        if output:
+            with open(output, "w") as f:
+                f.write(report + "\n")
+        else:
+            self.stdout.write(report)
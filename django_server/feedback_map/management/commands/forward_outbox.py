@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from feedback_map.forwarding import forward_pending_messages, prune_sent_messages
+
+# Seconds between deleting old sent messages
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = "Forward queued map data point changes from the outbox to Kafka and the IoT feedback API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Number of messages to send per batch")
+        parser.add_argument(
+            "--interval", type=float, default=1.0, help="Seconds to wait before polling an empty outbox again"
+        )
+        parser.add_argument("--once", action="store_true", help="Send all due messages and exit")
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        pruned_at = None
+        while True:
+            if pruned_at is None or time.monotonic() - pruned_at > PRUNE_INTERVAL:
+                prune_sent_messages()
+                pruned_at = time.monotonic()
+            if forward_pending_messages(batch_size=batch_size):
+                continue
+            if once:
+                return
+            time.sleep(interval)
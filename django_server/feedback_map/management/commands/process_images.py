@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from feedback_map.images import process_pending_images
+from feedback_map.models import MapDataPoint
+from feedback_map.models.map_data_points import IMAGE_PENDING, IMAGE_PROCESSING, IMAGE_FAILED
+
+
+class Command(BaseCommand):
+    help = (
+        "Process pending map data point images, e.g. ones left unprocessed by a restart. Images are normally processed "
+        "in the background right after upload."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Number of images to process per batch")
+        parser.add_argument(
+            "--retry",
+            action="store_true",
+            help="Also retry images that failed or were left processing. Make sure no other process is processing "
+            "images when using this.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running, looking for pending images every this many seconds, instead of exiting when done",
+        )
+
+    def handle(self, *args, batch_size, retry, interval, **options):
+        if retry:
+            MapDataPoint.objects.filter(image_status__in=[IMAGE_PROCESSING, IMAGE_FAILED]).update(
+                image_status=IMAGE_PENDING
+            )
+        while True:
+            total = 0
+            while True:
+                count = process_pending_images(batch_size=batch_size)
+                if not count:
+                    break
+                total += count
+            if interval is None:
+                self.stdout.write(f"Processed {total} images.")
+                return
+            if total:
+                self.stdout.write(f"Processed {total} images.")
+            time.sleep(interval)
@@ -0,0 +1,84 @@
+"""
+Per-request database query instrumentation.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+IN_LIST_RE = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+def query_fingerprint(sql):
+    """
+    Return the given SQL with parameter lists and literal numbers collapsed, so that queries differing only by their
+    parameters get the same fingerprint.
+    """
+    return NUMBER_RE.sub("N", IN_LIST_RE.sub("(...)", sql))
+
+
+class QueryStats:
+    """
+    Database execute wrapper recording the number, total duration and fingerprints of the queries run through it.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[query_fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """
+        Return {fingerprint: count} of queries run more than once, typically the symptom of an N+1 query pattern.
+        """
+        return {fingerprint: count for fingerprint, count in self.fingerprints.items() if count > 1}
+
+    def server_timing(self):
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries, {len(self.duplicates())} duplicated"'
+
+
+class QueryStatsMiddleware:
+    """
+    Record the database queries of each request. With the DB_QUERY_SERVER_TIMING setting the totals are added to the
+    response as a Server-Timing header, and with LOG_DB_QUERIES they are logged together with duplicated queries.
+
+    Queries run while streaming a response body are not included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (settings.DB_QUERY_SERVER_TIMING or settings.LOG_DB_QUERIES):
+            return self.get_response(request)
+
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+
+        if settings.DB_QUERY_SERVER_TIMING:
+            response["Server-Timing"] = stats.server_timing()
+        if settings.LOG_DB_QUERIES:
+            logging.info(
+                f"{request.method} {request.path}: {stats.count} queries in {stats.duration * 1000:.1f} ms "
+                f"-> {response.status_code}"
+            )
+            for fingerprint, count in stats.duplicates().items():
+                logging.warning(f"{request.method} {request.path}: query run {count} times: {fingerprint}")
+        return response
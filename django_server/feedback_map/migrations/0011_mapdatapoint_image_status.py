@@ -0,0 +1,25 @@
+# Generated by Django 3.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    # Images uploaded so far were processed synchronously when saved:
+    MapDataPoint = apps.get_model("feedback_map", "MapDataPoint")
+    MapDataPoint.objects.exclude(image="").exclude(image__isnull=True).update(image_status="READY")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback_map', '0010_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mapdatapoint',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('', 'No image'), ('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='', max_length=16),
+        ),
+        migrations.RunPython(mark_existing_images_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.18 on 2026-10-18 12:03
+
+from django.db import migrations
+
+
+def reprocess_images(apps, schema_editor):
+    # Queue processed images for processing again to generate their downscaled versions. The process_images
+    # management command, run periodically by the images service of docker-compose, processes them after migrating.
+    MapDataPoint = apps.get_model("feedback_map", "MapDataPoint")
+    MapDataPoint.objects.filter(image_status="READY").update(image_status="PENDING")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback_map', '0011_mapdatapoint_image_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(reprocess_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:20
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('feedback_map', '0012_reprocess_images'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mapdatapoint',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('visible', True)), fields=['geom'], name='mdp_visible_geom_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mapdatapoint',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('visible', True)), fields=['geog'], name='mdp_visible_geog_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mapdatapoint',
+            index=models.Index(condition=models.Q(('visible', True)), fields=['created_at', 'id'], name='mdp_visible_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mapdatapoint',
+            index=models.Index(condition=models.Q(('visible', True)), fields=['modified_at', 'id'], name='mdp_visible_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mapdatapointcommentnotification',
+            index=models.Index(fields=['user', 'seen'], name='notification_user_seen_idx'),
+        ),
+    ]
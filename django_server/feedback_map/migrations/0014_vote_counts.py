@@ -0,0 +1,91 @@
+# Generated by Django 3.2.18 on 2026-10-18 15:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+COUNT_VOTES_SQL = """
+CREATE FUNCTION feedback_map_count_votes() RETURNS trigger AS $$
+BEGIN
+    -- TG_ARGV[0] is the name of the counter column on feedback_map_mapdatapoint
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        EXECUTE format('UPDATE feedback_map_mapdatapoint SET %1$I = %1$I - 1 WHERE id = $1', TG_ARGV[0])
+            USING OLD.map_data_point_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        EXECUTE format('UPDATE feedback_map_mapdatapoint SET %1$I = %1$I + 1 WHERE id = $1', TG_ARGV[0])
+            USING NEW.map_data_point_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER feedback_map_count_upvotes
+AFTER INSERT OR UPDATE OF map_data_point_id OR DELETE ON feedback_map_mapdatapointupvote
+FOR EACH ROW EXECUTE PROCEDURE feedback_map_count_votes('upvote_count');
+
+CREATE TRIGGER feedback_map_count_downvotes
+AFTER INSERT OR UPDATE OF map_data_point_id OR DELETE ON feedback_map_mapdatapointdownvote
+FOR EACH ROW EXECUTE PROCEDURE feedback_map_count_votes('downvote_count');
+"""
+
+DROP_COUNT_VOTES_SQL = """
+DROP TRIGGER feedback_map_count_upvotes ON feedback_map_mapdatapointupvote;
+DROP TRIGGER feedback_map_count_downvotes ON feedback_map_mapdatapointdownvote;
+DROP FUNCTION feedback_map_count_votes();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('feedback_map', '0013_indexes'),
+    ]
+
+    operations = [
+        # Keep the first of any duplicate votes, so that the unique constraints can be added:
+        migrations.RunSQL(
+            """
+            DELETE FROM feedback_map_mapdatapointupvote vote USING feedback_map_mapdatapointupvote earlier
+            WHERE vote.user_id = earlier.user_id AND vote.map_data_point_id = earlier.map_data_point_id
+                AND vote.id > earlier.id;
+            DELETE FROM feedback_map_mapdatapointdownvote vote USING feedback_map_mapdatapointdownvote earlier
+            WHERE vote.user_id = earlier.user_id AND vote.map_data_point_id = earlier.map_data_point_id
+                AND vote.id > earlier.id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='mapdatapointupvote',
+            constraint=models.UniqueConstraint(fields=('user', 'map_data_point'), name='unique_upvote'),
+        ),
+        migrations.AddConstraint(
+            model_name='mapdatapointdownvote',
+            constraint=models.UniqueConstraint(fields=('user', 'map_data_point'), name='unique_downvote'),
+        ),
+        migrations.AddField(
+            model_name='mapdatapoint',
+            name='upvote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='mapdatapoint',
+            name='downvote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='mapdatapoint',
+            index=models.Index(condition=models.Q(('visible', True)), fields=['upvote_count', 'id'], name='mdp_visible_upvotes_idx'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE feedback_map_mapdatapoint note SET
+                upvote_count = (SELECT count(*) FROM feedback_map_mapdatapointupvote WHERE map_data_point_id = note.id),
+                downvote_count = (SELECT count(*) FROM feedback_map_mapdatapointdownvote WHERE map_data_point_id = note.id)
+            WHERE EXISTS (SELECT 1 FROM feedback_map_mapdatapointupvote WHERE map_data_point_id = note.id)
+                OR EXISTS (SELECT 1 FROM feedback_map_mapdatapointdownvote WHERE map_data_point_id = note.id);
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(COUNT_VOTES_SQL, DROP_COUNT_VOTES_SQL),
+    ]
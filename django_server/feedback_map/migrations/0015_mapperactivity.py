@@ -0,0 +1,43 @@
+# Generated by Django 3.2.18 on 2026-10-18 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_mapper_activity(apps, schema_editor):
+    schema_editor.execute(
+        """
+        INSERT INTO feedback_map_mapperactivity (user_id, date, note_count)
+        SELECT created_by_id, (created_at AT TIME ZONE %s)::date, count(*)
+        FROM feedback_map_mapdatapoint
+        WHERE created_by_id IS NOT NULL
+        GROUP BY 1, 2
+        """,
+        [settings.TIME_ZONE],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('feedback_map', '0014_vote_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapperActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('note_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mapper_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='mapperactivity',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_mapper_activity'),
+        ),
+        migrations.RunPython(backfill_mapper_activity, migrations.RunPython.noop),
+    ]
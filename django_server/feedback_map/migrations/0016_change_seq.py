@@ -0,0 +1,79 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+# Every insert and update of a note takes the next value of feedback_map_change_seq, and every delete writes a
+# tombstone with one. The transaction-level advisory lock makes writers take the values in commit order, so a client
+# that has seen everything up to a value can never later miss a change with a smaller one.
+CHANGE_SEQ_SQL = """
+CREATE SEQUENCE feedback_map_change_seq;
+
+CREATE FUNCTION feedback_map_next_change_seq() RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('feedback_map_change_seq'));
+    RETURN nextval('feedback_map_change_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION feedback_map_set_change_seq() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := feedback_map_next_change_seq();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION feedback_map_write_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO feedback_map_mapdatapointtombstone (map_data_point_id, change_seq, deleted_at)
+    VALUES (OLD.id, feedback_map_next_change_seq(), now());
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+UPDATE feedback_map_mapdatapoint note SET change_seq = ordered.seq
+FROM (SELECT id, row_number() OVER (ORDER BY modified_at, id) AS seq FROM feedback_map_mapdatapoint) ordered
+WHERE note.id = ordered.id;
+SELECT setval('feedback_map_change_seq', (SELECT count(*) + 1 FROM feedback_map_mapdatapoint), false);
+
+CREATE TRIGGER feedback_map_set_change_seq
+BEFORE INSERT OR UPDATE ON feedback_map_mapdatapoint
+FOR EACH ROW EXECUTE PROCEDURE feedback_map_set_change_seq();
+
+CREATE TRIGGER feedback_map_write_tombstone
+AFTER DELETE ON feedback_map_mapdatapoint
+FOR EACH ROW EXECUTE PROCEDURE feedback_map_write_tombstone();
+"""
+
+DROP_CHANGE_SEQ_SQL = """
+DROP TRIGGER feedback_map_write_tombstone ON feedback_map_mapdatapoint;
+DROP TRIGGER feedback_map_set_change_seq ON feedback_map_mapdatapoint;
+DROP FUNCTION feedback_map_write_tombstone();
+DROP FUNCTION feedback_map_set_change_seq();
+DROP FUNCTION feedback_map_next_change_seq();
+DROP SEQUENCE feedback_map_change_seq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback_map', '0015_mapperactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapDataPointTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('map_data_point_id', models.IntegerField()),
+                ('change_seq', models.BigIntegerField(unique=True)),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mapdatapoint',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(CHANGE_SEQ_SQL, DROP_CHANGE_SEQ_SQL),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 3.2.18 on 2026-10-18 19:02
+
+from django.db import migrations
+
+# Sends a NOTIFY on the feedback_map_notes channel for every created, updated, hidden and deleted note, for the live
+# feed in feedback_map.live. Notifications are delivered when the transaction commits. Changes to notes that were and
+# stay hidden are of no interest to map clients and are not sent. The payload must stay under 8000 bytes, so it
+# contains only the position of the note; the feed reads the rest from the table.
+NOTIFY_SQL = """
+CREATE FUNCTION feedback_map_notify_note() RETURNS trigger AS $$
+DECLARE
+    note feedback_map_mapdatapoint;
+    event text;
+    moved_from json;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        note := OLD;
+        event := 'deleted';
+    ELSE
+        note := NEW;
+        IF NEW.visible THEN
+            event := CASE WHEN TG_OP = 'INSERT' THEN 'created' ELSE 'updated' END;
+        ELSIF TG_OP = 'UPDATE' AND OLD.visible THEN
+            event := 'hidden';
+        ELSE
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP = 'UPDATE' AND (OLD.lon, OLD.lat) IS DISTINCT FROM (NEW.lon, NEW.lat) THEN
+        moved_from := json_build_array(OLD.lon, OLD.lat);
+    END IF;
+    PERFORM pg_notify('feedback_map_notes', json_build_object(
+        'event', event,
+        'id', note.id,
+        'lon', note.lon,
+        'lat', note.lat,
+        'moved_from', moved_from,
+        'change_seq', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE note.change_seq END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER feedback_map_notify_note
+AFTER INSERT OR UPDATE OR DELETE ON feedback_map_mapdatapoint
+FOR EACH ROW EXECUTE PROCEDURE feedback_map_notify_note();
+"""
+
+DROP_NOTIFY_SQL = """
+DROP TRIGGER feedback_map_notify_note ON feedback_map_mapdatapoint;
+DROP FUNCTION feedback_map_notify_note();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback_map', '0016_change_seq'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_SQL, DROP_NOTIFY_SQL),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.18 on 2026-10-18 21:40
+
+from importlib import import_module
+
+from django.db import migrations
+
+# Every vote updates the vote counts of the note, see migration 0014. Sending each of those to the live feed would
+# make it fetch and send the whole note to every subscriber, so updates that change nothing but the vote counts (and
+# the change_seq set for every update) are left out.
+NOTIFY_SQL = """
+CREATE OR REPLACE FUNCTION feedback_map_notify_note() RETURNS trigger AS $$
+DECLARE
+    note feedback_map_mapdatapoint;
+    event text;
+    moved_from json;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        note := OLD;
+        event := 'deleted';
+    ELSE
+        note := NEW;
+        IF NEW.visible THEN
+            event := CASE WHEN TG_OP = 'INSERT' THEN 'created' ELSE 'updated' END;
+        ELSIF TG_OP = 'UPDATE' AND OLD.visible THEN
+            event := 'hidden';
+        ELSE
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.visible AND NEW.visible
+            AND to_jsonb(OLD) - '{upvote_count,downvote_count,change_seq}'::text[]
+                = to_jsonb(NEW) - '{upvote_count,downvote_count,change_seq}'::text[] THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' AND (OLD.lon, OLD.lat) IS DISTINCT FROM (NEW.lon, NEW.lat) THEN
+        moved_from := json_build_array(OLD.lon, OLD.lat);
+    END IF;
+    PERFORM pg_notify('feedback_map_notes', json_build_object(
+        'event', event,
+        'id', note.id,
+        'lon', note.lon,
+        'lat', note.lat,
+        'moved_from', moved_from,
+        'change_seq', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE note.change_seq END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# The function as created in migration 0017
+PREVIOUS_NOTIFY_SQL = (
+    import_module("feedback_map.migrations.0017_notify_note_changes")
+    .NOTIFY_SQL.split("CREATE TRIGGER")[0]
+    .replace("CREATE FUNCTION", "CREATE OR REPLACE FUNCTION")
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feedback_map', '0017_notify_note_changes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_SQL, PREVIOUS_NOTIFY_SQL),
+    ]
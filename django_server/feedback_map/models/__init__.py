@@ -1,2 +1,5 @@
 from .map_data_points import (
-    MapDataPoint, Tag, MapDataPointUpvote, MapDataPointDownvote, MapDataPointComment, MapDataPointCommentNotification)
+    MapDataPoint, Tag, MapDataPointUpvote, MapDataPointDownvote, MapDataPointComment, MapDataPointCommentNotification,
+    MapDataPointTombstone)
+from .outbox import OutboxMessage
+from .mapper_activity import MapperActivity
@@ -1,12 +1,14 @@
-from io import BytesIO
+import os
 
-from PIL import Image as Img, UnidentifiedImageError, ExifTags
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
-from django.core.files import File
+from django.contrib.postgres.indexes import GistIndex
+from django.db import connection, transaction
 from django.contrib.gis.db import models
 from django.contrib.gis.geos import Point
 
+from feedback_map import notification_counts
+from feedback_map.background import run_after_commit
 from . import base
 from .base import TimestampedModel
 
@@ -15,6 +17,23 @@ def upload_images_to(instance, filename):
     return f"map_data_points/{instance.id}/{filename}"
 
 
+# Longest side in pixels of the downscaled versions generated for each uploaded image:
+IMAGE_VARIANT_SIZES = [256, 768, 1600]
+IMAGE_VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+
+def image_variant_names(image_name):
+    """
+    Return the storage names of the downscaled versions of the given image as {size: {format: name}}. They are
+    stored next to the original image.
+    """
+    stem = os.path.splitext(image_name)[0]
+    return {
+        size: {extension: f"{stem}_{size}.{extension}" for extension in IMAGE_VARIANT_FORMATS}
+        for size in IMAGE_VARIANT_SIZES
+    }
+
+
 class Tag(models.Model):
     tag = models.CharField(max_length=64, primary_key=True, unique=True)
     color = models.CharField(
@@ -43,6 +62,19 @@ STATUS_CHOICES = [
     ("REOPENED", "Reopened"),
 ]
 
+IMAGE_PENDING = "PENDING"
+IMAGE_PROCESSING = "PROCESSING"
+IMAGE_READY = "READY"
+IMAGE_FAILED = "FAILED"
+
+IMAGE_STATUS_CHOICES = [
+    ("", "No image"),
+    (IMAGE_PENDING, "Pending"),
+    (IMAGE_PROCESSING, "Processing"),
+    (IMAGE_READY, "Ready"),
+    (IMAGE_FAILED, "Failed"),
+]
+
 
 class MapDataPoint(TimestampedModel):
     lat = models.DecimalField(max_digits=11, decimal_places=8)
@@ -52,6 +84,7 @@ class MapDataPoint(TimestampedModel):
     geog = models.PointField(srid=4326, null=True, blank=True, geography=True)
     geom = models.PointField(srid=4326, null=True, blank=True, geography=False)
     image = models.ImageField(null=True, blank=True, upload_to=upload_images_to)
+    image_status = models.CharField(max_length=16, choices=IMAGE_STATUS_CHOICES, default="", blank=True)
     comment = models.TextField(blank=True)
     tags = ArrayField(base_field=models.CharField(max_length=64), default=list, blank=True)
     device_id = models.CharField(max_length=64, blank=True)
@@ -66,50 +99,105 @@ class MapDataPoint(TimestampedModel):
     hidden_reason = models.TextField(
         blank=True, help_text="If reviewer decides to hide the note, document reason here."
     )
+    # Kept up to date by triggers on the vote tables, see migration 0014:
+    upvote_count = models.PositiveIntegerField(default=0, editable=False)
+    downvote_count = models.PositiveIntegerField(default=0, editable=False)
+    # Position of the latest change of this note in the change sequence shared with MapDataPointTombstones. Set by a
+    # trigger on every insert and update, see migration 0016.
+    change_seq = models.BigIntegerField(null=True, editable=False, db_index=True)
+
+    class Meta:
+        # Partial indexes matching the filters of the ReST API, which only ever serves visible notes. The geometry
+        # fields also have full spatial indexes, created by default.
+        indexes = [
+            GistIndex(fields=["geom"], condition=models.Q(visible=True), name="mdp_visible_geom_idx"),
+            GistIndex(fields=["geog"], condition=models.Q(visible=True), name="mdp_visible_geog_idx"),
+            models.Index(fields=["created_at", "id"], condition=models.Q(visible=True), name="mdp_visible_created_idx"),
+            models.Index(
+                fields=["modified_at", "id"], condition=models.Q(visible=True), name="mdp_visible_modified_idx"
+            ),
+            models.Index(
+                fields=["upvote_count", "id"], condition=models.Q(visible=True), name="mdp_visible_upvotes_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.comment or super().__str__()
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Where the note is stored, for invalidating the cached tile there if it is moved, see feedback_map.tile_cache:
+        instance._loaded_position = (instance.__dict__.get("lon"), instance.__dict__.get("lat"))
+        return instance
+
+    def update_geometry(self):
         # Use lat and lon to create a point
         if self.lat and self.lon:
             self.geom = Point(float(self.lon), float(self.lat), srid=4326)
             self.geog = Point(float(self.lon), float(self.lat), srid=4326)
 
-        if not self.image:
-            return super().save(*args, **kwargs)
-
-        try:
-            pilImage = Img.open(BytesIO(self.image.read()))
-        except (UnidentifiedImageError, FileNotFoundError):
-            return super().save(*args, **kwargs)
-
-        for orientation in ExifTags.TAGS.keys():
-            if ExifTags.TAGS[orientation] == "Orientation":
-                break
-
-        exif = pilImage._getexif()  # noqa
-        if not exif:
-            return super().save(*args, **kwargs)
-
-        exif = dict(exif.items())
-        orientation = exif.get(orientation, None)
-        if not orientation:
-            return super().save(*args, **kwargs)
-
-        if orientation == 3:
-            pilImage = pilImage.rotate(180, expand=True)
-        elif orientation == 6:
-            pilImage = pilImage.rotate(270, expand=True)
-        elif orientation == 8:
-            pilImage = pilImage.rotate(90, expand=True)
-
-        output = BytesIO()
-        pilImage.save(output, format="JPEG", quality=75)
-        output.seek(0)
-        self.image = File(output, self.image.name)
-
-        return super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        self.update_geometry()
+        # A newly assigned image is not yet committed to storage; saves that don't change the image leave it alone:
+        new_image = bool(self.image) and not self.image._committed
+        if new_image:
+            self.image_status = IMAGE_PENDING
+        elif not self.image:
+            self.image_status = ""
+
+        # Run post_save receivers, e.g. writing the forwarding outbox, in the same transaction as the save itself:
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._loaded_position = (self.lon, self.lat)
+            if new_image:
+                from feedback_map.images import process_image
+
+                run_after_commit(process_image, self.id)
+
+    def vote(self, user, upvote=True):
+        """
+        Upvote or downvote this note as the given user, replacing any opposite vote, in a single statement. Voting
+        twice the same way is a no-op. The vote counts of this instance are refreshed.
+        """
+        if upvote:
+            vote_model, opposite_model = MapDataPointUpvote, MapDataPointDownvote
+        else:
+            vote_model, opposite_model = MapDataPointDownvote, MapDataPointUpvote
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH added AS (
+                    INSERT INTO {vote_model._meta.db_table} (user_id, map_data_point_id)
+                    VALUES (%(user)s, %(note)s)
+                    ON CONFLICT (user_id, map_data_point_id) DO NOTHING
+                )
+                DELETE FROM {opposite_model._meta.db_table}
+                WHERE user_id = %(user)s AND map_data_point_id = %(note)s
+                """,
+                {"user": user.id, "note": self.id},
+            )
+        self.refresh_from_db(fields=["upvote_count", "downvote_count"])
+        from feedback_map import tile_cache
+
+        tile_cache.invalidate_notes([self])
+
+    @classmethod
+    def latest_change_seq(cls) -> int:
+        """
+        Return the change_seq of the latest committed change to any note, deletes included. It grows with every
+        change, so it works as a version of the whole table.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT GREATEST(
+                    (SELECT max(change_seq) FROM {cls._meta.db_table}),
+                    (SELECT max(change_seq) FROM {MapDataPointTombstone._meta.db_table})
+                )
+                """
+            )
+            return cursor.fetchone()[0] or 0
 
     def is_processed(self):
         return bool(self.processed_by_id)
@@ -123,16 +211,47 @@ class MapDataPoint(TimestampedModel):
             | models.Q(groups__name=REVIEWER_GROUP)
         ).distinct()
 
+    def interested_user_ids(self):
+        """
+        Return the ids of the users interested in this note, fetched in a single query.
+        """
+        from feedback_map.rest.permissions import REVIEWER_GROUP
+
+        note_users = User.objects.filter(
+            id__in=[self.created_by_id, self.modified_by_id, self.processed_by_id]
+        ).values_list("id", flat=True)
+        commenters = MapDataPointComment.objects.filter(map_data_point=self, user__isnull=False).values_list(
+            "user_id", flat=True
+        )
+        reviewers = User.groups.through.objects.filter(group__name=REVIEWER_GROUP).values_list("user_id", flat=True)
+        return set(note_users.union(commenters, reviewers))
+
+
+class MapDataPointTombstone(base.Model):
+    """
+    Record of a deleted map data point for syncing clients, written by a trigger on delete.
+    """
+
+    map_data_point_id = models.IntegerField()
+    change_seq = models.BigIntegerField(unique=True)
+    deleted_at = models.DateTimeField()
+
 
 class MapDataPointUpvote(base.Model):
     user = models.ForeignKey(User, related_name="map_data_point_upvotes", on_delete=models.CASCADE)
     map_data_point = models.ForeignKey(MapDataPoint, related_name="upvotes", on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "map_data_point"], name="unique_upvote")]
+
 
 class MapDataPointDownvote(base.Model):
     user = models.ForeignKey(User, related_name="map_data_point_downvotes", on_delete=models.CASCADE)
     map_data_point = models.ForeignKey(MapDataPoint, related_name="downvotes", on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "map_data_point"], name="unique_downvote")]
+
 
 class MapDataPointComment(base.Model):
     user = models.ForeignKey(
@@ -156,12 +275,27 @@ class MapDataPointComment(base.Model):
         Create MapDataPointCommentNotifications for users interested in this image note to notify them of the new
         comment
         """
-        for user in self.map_data_point.interested_users():
-            if user != self.user:
-                self.notifications.create(user=user)
+        user_ids = self.map_data_point.interested_user_ids() - {self.user_id}
+        MapDataPointCommentNotification.objects.bulk_create(
+            [MapDataPointCommentNotification(comment=self, user_id=user_id) for user_id in sorted(user_ids)]
+        )
+        notification_counts.increment(user_ids)
+
+
+def notify_comment_users(comment_id):
+    """
+    Background task notifying the users interested in a note of a new comment. Notifications are best effort: a
+    fan-out lost e.g. to a restart is not retried.
+    """
+    comment = MapDataPointComment.objects.select_related("map_data_point").filter(id=comment_id).first()
+    if comment is not None:
+        comment.notify_users()
 
 
 class MapDataPointCommentNotification(base.Model):
     comment = models.ForeignKey(MapDataPointComment, related_name="notifications", on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name="notifications", on_delete=models.CASCADE)
     seen = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "seen"], name="notification_user_seen_idx")]
@@ -0,0 +1,46 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import connection, models
+from django.utils import timezone
+
+from . import base
+
+
+class MapperActivity(base.Model):
+    """
+    Number of map data points created by a user on a given (local) day, maintained as notes are created and deleted
+    so that listing recent mappers needs no scan of the notes.
+    """
+
+    user = models.ForeignKey(User, related_name="mapper_activity", on_delete=models.CASCADE)
+    date = models.DateField(db_index=True)
+    note_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "date"], name="unique_mapper_activity")]
+
+    @classmethod
+    def record(cls, notes, delta=1):
+        """
+        Add `delta` to the daily note counts of the creators of the given notes, in a single statement.
+        """
+        counts = Counter(
+            (note.created_by_id, timezone.localdate(note.created_at)) for note in notes if note.created_by_id
+        )
+        if not counts:
+            return
+        table = cls._meta.db_table
+        values = ", ".join(["(%s, %s, %s)"] * len(counts))
+        # Sorted to lock the rows in a consistent order:
+        params = [
+            param for (user_id, date), count in sorted(counts.items()) for param in (user_id, date, count * delta)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (user_id, date, note_count) VALUES {values}
+                ON CONFLICT (user_id, date) DO UPDATE SET note_count = {table}.note_count + EXCLUDED.note_count
+                """,
+                params,
+            )
@@ -0,0 +1,38 @@
+from django.db import models
+from django.utils import timezone
+
+from . import base
+from .map_data_points import MapDataPoint
+
+DESTINATION_CHOICES = [
+    ("http", "IoT feedback API"),
+    ("kafka", "Kafka"),
+]
+
+
+class OutboxMessage(base.Model):
+    """
+    A change to a map data point waiting to be forwarded to an external destination. Messages are written in the
+    same transaction as the change itself and sent by the forward_outbox management command. Messages that fail
+    OUTBOX_MAX_ATTEMPTS times are marked failed and left unsent, so that later changes to the note can be forwarded.
+    """
+
+    map_data_point = models.ForeignKey(MapDataPoint, related_name="outbox_messages", on_delete=models.CASCADE)
+    destination = models.CharField(max_length=16, choices=DESTINATION_CHOICES)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(sent_at__isnull=True, failed_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+        ]
@@ -0,0 +1,47 @@
+"""
+Cached per-user counts of unread comment notifications, for cheap notification badge polling.
+
+Counts are adjusted in place when notifications are created or marked seen, and recounted from the db when missing
+from the cache. They expire after UNREAD_NOTIFICATION_COUNT_TTL seconds to bound the effect of any missed update.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+def cache_key(user_id):
+    return f"feedback_map:unread_notifications:{user_id}"
+
+
+def unread_count(user_id) -> int:
+    count = cache.get(cache_key(user_id))
+    if count is None:
+        from feedback_map.models import MapDataPointCommentNotification
+
+        count = MapDataPointCommentNotification.objects.filter(user_id=user_id, seen__isnull=True).count()
+        cache.add(cache_key(user_id), count, settings.UNREAD_NOTIFICATION_COUNT_TTL)
+    return max(count, 0)
+
+
+def adjust(user_ids, delta):
+    for user_id in user_ids:
+        try:
+            cache.incr(cache_key(user_id), delta)
+        except ValueError:
+            # Not cached, will be counted on next read
+            pass
+
+
+def increment(user_ids):
+    adjust(user_ids, 1)
+
+
+def decrement(user_id):
+    adjust([user_id], -1)
+
+
+def reset(user_id):
+    cache.set(cache_key(user_id), 0, settings.UNREAD_NOTIFICATION_COUNT_TTL)
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
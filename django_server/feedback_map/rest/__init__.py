@@ -5,6 +5,7 @@ from .views import (
     MapDataPointsViewSet,
     MapDataPointCommentsViewSet,
     MapDataPointsGeoJSON,
+    MapDataPointTilesView,
     MapDataPointCommentNotificationsViewSet,
     RecentMappersViewSet,
     TagsViewSet,
@@ -20,5 +21,10 @@ router.register("tags", TagsViewSet)
 
 urlpatterns = [
     path("map_data_points.geojson", MapDataPointsGeoJSON.as_view(), name="map_data_points_geojson"),
+    path(
+        "map_data_points/tiles/<int:z>/<int:x>/<int:y>.mvt",
+        MapDataPointTilesView.as_view(),
+        name="map_data_points_tiles",
+    ),
     path("iotdevice", IotDeviceView.as_view(), name="iotdevice"),
 ] + router.urls
@@ -0,0 +1,130 @@
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination, Cursor
+from rest_framework.settings import api_settings
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on (ordering field, id).
+
+    DRF's CursorPagination positions on the ordering field alone and steps over ties with an offset. Here the cursor
+    holds the full (value, id) key of the last item on the page instead, so each page is a single index range scan
+    no matter how deep the client pages, and no items are skipped or repeated when values tie.
+    """
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    ordering = "-created_at"
+    ordering_fields = ["created_at"]
+    tiebreaker = "id"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, "").split(",")[0].strip()
+        if ordering.lstrip("-") not in self.ordering_fields:
+            ordering = self.ordering
+        return (ordering,)
+
+    def get_key(self):
+        field = self.ordering[0].lstrip("-")
+        return [field] if field == self.tiebreaker else [field, self.tiebreaker]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        descending = self.ordering[0].startswith("-") != reverse
+
+        key = self.get_key()
+        queryset = queryset.order_by(*[("-" if descending else "") + field for field in key])
+        if self.cursor is not None:
+            try:
+                position = json.loads(self.cursor.position)
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = self.filter_after(queryset, key, position, descending)
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def filter_after(self, queryset, key, values, descending):
+        lookup = "lt" if descending else "gt"
+        # The redundant lt(e) / gt(e) filter on the first key field lets the db use an index range scan:
+        queryset = queryset.filter(**{f"{key[0]}__{lookup}e": values[0]})
+        if len(key) == 1:
+            return queryset.filter(**{f"{key[0]}__{lookup}": values[0]})
+        return queryset.filter(Q(**{f"{key[0]}__{lookup}": values[0]}) | Q(**{f"{key[1]}__{lookup}": values[1]}))
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            values = [instance[field] for field in self.get_key()]
+        else:
+            values = [getattr(instance, field) for field in self.get_key()]
+        return json.dumps([str(value) for value in values])
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+
+class MapDataPointsKeysetPagination(KeysetPagination):
+    ordering_fields = ["created_at", "modified_at", "upvote_count", "downvote_count"]
+
+
+class CommentsKeysetPagination(KeysetPagination):
+    ordering = "created_at"
+
+
+class NotificationsKeysetPagination(KeysetPagination):
+    ordering = "-id"
+    ordering_fields = ["id"]
+
+
+class SelectablePaginationMixin:
+    """
+    Use `cursor_pagination_class` when the client requests it with `pagination=cursor` (or follows a cursor link),
+    and `pagination_class` otherwise.
+    """
+
+    cursor_pagination_class = None
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return params.get("pagination") == "cursor" or "cursor" in params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.cursor_pagination_class and getattr(self, "request", None):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -1,13 +1,46 @@
 from datetime import timedelta
 
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.timezone import now
 from rest_framework import permissions
 
 REVIEWER_GROUP = 'Reviewer'
 
 
+def group_names_cache_key(user_id):
+    return f'feedback_map:user_group_names:{user_id}'
+
+
+def user_group_names(user):
+    """
+    Return the names of the groups of the given user. They are fetched once per user object, i.e. once per request,
+    and shared between requests through the cache for GROUP_MEMBERSHIP_CACHE_TTL seconds.
+    """
+    if user.is_anonymous:
+        return frozenset()
+    names = getattr(user, '_group_names', None)
+    if names is None:
+        ttl = settings.GROUP_MEMBERSHIP_CACHE_TTL
+        names = cache.get(group_names_cache_key(user.id)) if ttl else None
+        if names is None:
+            names = frozenset(user.groups.values_list('name', flat=True))
+            if ttl:
+                cache.set(group_names_cache_key(user.id), names, ttl)
+        user._group_names = names
+    return names
+
+
+def invalidate_user_group_names(user_ids):
+    cache.delete_many([group_names_cache_key(user_id) for user_id in user_ids])
+
+
+def user_in_group(user, group_name):
+    return group_name in user_group_names(user)
+
+
 def user_is_reviewer(user):
-    return user.groups.filter(name=REVIEWER_GROUP).exists()
+    return user_in_group(user, REVIEWER_GROUP)
 
 
 class UserBelongsToGroup(permissions.IsAuthenticated):
@@ -15,7 +48,7 @@ class UserBelongsToGroup(permissions.IsAuthenticated):
 
     def has_permission(self, request, view):
         return (super(UserBelongsToGroup, self).has_permission(request, view) and
-                request.user.groups.filter(name=self.group_name).exists())
+                user_in_group(request.user, self.group_name))
 
 
 class IsReviewer(UserBelongsToGroup):
@@ -27,7 +60,8 @@ class IsReviewerOrCreator(permissions.BasePermission):
         if request.user.is_anonymous:
             # Anonymous users can edit new anonymous notes in order to be able to attach an image to a freshly
             # created note:
-            return map_data_point_obj.created_by is None and map_data_point_obj.created_at > now() - timedelta(minutes=10)
-        if request.user.groups.filter(name=REVIEWER_GROUP).exists():
+            return (map_data_point_obj.created_by_id is None and
+                    map_data_point_obj.created_at > now() - timedelta(minutes=10))
+        if user_is_reviewer(request.user):
             return True
         return map_data_point_obj.created_by_id == request.user.id
@@ -0,0 +1,28 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def dumps(data) -> bytes:
+    """
+    Encode data as compact JSON like JSONRenderer does, with orjson.
+    """
+    try:
+        # Leave datetimes to the DRF encoder, which formats UTC as "Z":
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    except TypeError:
+        # e.g. integers over 64 bits or non-string dict keys, which orjson doesn't support
+        return JSONRenderer().render(data)
+    return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement of JSONRenderer producing the same output several times faster with orjson. Uses
+    JSONRenderer when indented output is requested.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
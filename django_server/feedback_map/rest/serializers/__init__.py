@@ -2,5 +2,5 @@ from .base import BaseMapDataPointSerializer
 from .map_data_point import MapDataPointCommentSerializer, MapDataPointCommentNotificationSerializer, \
     DictMapDataPointSerializer, MapDataPointSerializer, TagSerializer
 from .password_reset import PasswordResetSerializer
-from .user import BaseUserSerializer, UserSerializer
+from .user import BaseUserSerializer, RecentMapperSerializer, UserSerializer
 from .rounding_decimal_field import RoundingDecimalField
@@ -20,6 +20,8 @@ class BaseMapDataPointSerializer(serializers.ModelSerializer):
             "tags",
             "created_at",
             "modified_at",
+            "upvote_count",
+            "downvote_count",
         ]
 
     def to_representation(self, instance):
@@ -1,8 +1,12 @@
 from django.conf import settings
+from django.http import Http404
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from rest_framework.generics import get_object_or_404
 
 from feedback_map import models
+from feedback_map.models.map_data_points import IMAGE_READY, image_variant_names
+from feedback_map.tag_registry import tag_registry
 
 from .base import BaseMapDataPointSerializer
 
@@ -29,39 +33,136 @@ class MapDataPointCommentNotificationSerializer(serializers.ModelSerializer):
         fields = ['comment', 'id']
 
 
+def image_variant_urls(image_name, image_status):
+    """
+    Return the URLs of the downscaled versions of the given image as {size: {format: url}}, or None if they are
+    not available (yet).
+    """
+    if not image_name or image_status != IMAGE_READY:
+        return None
+    return {
+        str(size): {extension: settings.MEDIA_URL + name for extension, name in names.items()}
+        for size, names in image_variant_names(image_name).items()
+    }
+
+
+def iso_datetime(value):
+    """
+    Format an aware datetime in the current time zone like serializers.DateTimeField does.
+    """
+    if value is None:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def decimal_string(value):
+    # Values come from the db with the scale of the model field, so there is nothing to quantize
+    return None if value is None else f'{value:f}'
+
+
 class DictMapDataPointSerializer(BaseMapDataPointSerializer):
+    """
+    Serializes MapDataPoint .values() rows. The declared fields document the output, e.g. for the OpenAPI schema,
+    but to_representation skips DRF's field-by-field machinery and builds the output with the functions in
+    `representations`, which must give exactly the same result. The method fields are output by their get_ methods.
+
+    Pass `fields` to output only some of the fields, and select only `columns(fields)` for the rows.
+    """
+
     is_processed = serializers.BooleanField(read_only=True, source='processed_by_id')
     created_by = serializers.IntegerField(read_only=True, source='created_by_id')
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     false_default_fields = ['is_processed']
 
+    representations = {
+        'id': lambda note: note['id'],
+        'status': lambda note: note['status'],
+        'comment': lambda note: note['comment'],
+        'lat': lambda note: decimal_string(note['lat']),
+        'lon': lambda note: decimal_string(note['lon']),
+        'is_processed': lambda note: None if note['processed_by_id'] is None else bool(note['processed_by_id']),
+        'created_by': lambda note: note['created_by_id'],
+        'tags': lambda note: note['tags'],
+        'created_at': lambda note: iso_datetime(note['created_at']),
+        'modified_at': lambda note: iso_datetime(note['modified_at']),
+        'upvote_count': lambda note: note['upvote_count'],
+        'downvote_count': lambda note: note['downvote_count'],
+    }
+    # Columns read by each of the representations above, if other than the field itself:
+    sources = {
+        'image_variants': ['image', 'image_status'],
+        'is_processed': ['processed_by_id'],
+        'created_by': ['created_by_id'],
+    }
+
     class Meta:
         model = models.MapDataPoint
-        fields = BaseMapDataPointSerializer.Meta.fields
+        fields = BaseMapDataPointSerializer.Meta.fields + ['image_variants']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def columns(cls, fields=None):
+        """
+        Return the names of the columns needed to output the given fields, all fields by default.
+        """
+        columns = {}
+        for field in fields or cls.Meta.fields:
+            columns.update(dict.fromkeys(cls.sources.get(field, [field])))
+        return list(columns)
+
+    @cached_property
+    def field_representations(self):
+        return [(name, self.representations.get(name) or getattr(self, f'get_{name}')) for name in self.fields]
+
+    @cached_property
+    def false_defaults(self):
+        return [field for field in self.false_default_fields if field in self.fields]
 
     def to_representation(self, instance):
-        result = super().to_representation(instance)
-        for field in self.false_default_fields:
+        result = {}
+        for name, represent in self.field_representations:
+            value = represent(instance)
+            # Same pruning as in BaseMapDataPointSerializer:
+            if value is not None and value != []:
+                result[name] = value
+        for field in self.false_defaults:
             result.setdefault(field, False)
         return result
 
     def get_image(self, note):
         return settings.MEDIA_URL + note['image'] if note.get('image', None) else None
 
+    def get_image_variants(self, note):
+        return image_variant_urls(note.get('image', None), note.get('image_status', None))
+
 
 class ButtonPositionField(serializers.Field):
     def to_representation(self, data_point):
         if len(data_point.tags):
-            tag = models.Tag.objects.filter(
-                tag__in=data_point.tags, published__isnull=False, button_position__isnull=False).first()
-            if tag:
-                return {'button_position': tag.button_position}
+            button_position = tag_registry.button_position(data_point.tags)
+            if button_position is not None:
+                return {'button_position': button_position}
         return {}
 
     def to_internal_value(self, position):
         if position:
-            return {'tags': [get_object_or_404(models.Tag, button_position=position, published__isnull=False).tag]}
+            # Multipart posts send the position as a string
+            try:
+                position = int(position)
+            except (TypeError, ValueError):
+                raise serializers.ValidationError('A valid integer is required.')
+            tag = tag_registry.published_tag(position)
+            if tag is None:
+                raise Http404('No published tag at button position {}.'.format(position))
+            return {'tags': [tag]}
         return {}
 
 
@@ -70,8 +171,13 @@ class MapDataPointSerializer(BaseMapDataPointSerializer):
     # downvotes = serializers.SlugRelatedField(many=True, read_only=True, slug_field='user_id')
     comments = MapDataPointCommentSerializer(many=True, read_only=True)
     button_position = ButtonPositionField(source='*', required=False)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = models.MapDataPoint
-        fields = ['id', 'comment', 'image', 'lat', 'lon', 'created_at', 'button_position',
-                  'is_processed', 'tags', 'created_by', 'comments', 'device_id']  #, 'upvotes', 'downvotes']
+        fields = ['id', 'comment', 'image', 'image_variants', 'lat', 'lon', 'created_at', 'button_position',
+                  'is_processed', 'tags', 'created_by', 'comments', 'device_id', 'upvote_count',
+                  'downvote_count']  #, 'upvotes', 'downvotes']
+
+    def get_image_variants(self, note):
+        return image_variant_urls(note.image.name, note.image_status)
@@ -1,7 +1,7 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
-from feedback_map.rest.permissions import REVIEWER_GROUP
+from feedback_map.rest.permissions import user_is_reviewer
 
 
 class BaseUserSerializer(serializers.ModelSerializer):
@@ -10,6 +10,13 @@ class BaseUserSerializer(serializers.ModelSerializer):
         fields = ['id', 'first_name', 'last_name', 'username']
 
 
+class RecentMapperSerializer(BaseUserSerializer):
+    note_count = serializers.IntegerField(read_only=True)
+
+    class Meta(BaseUserSerializer.Meta):
+        fields = BaseUserSerializer.Meta.fields + ['note_count']
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_reviewer = serializers.SerializerMethodField()
 
@@ -17,11 +24,5 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'first_name', 'last_name', 'username', 'is_reviewer']
 
-    def user_in_group(self, user, group_name):
-        for group in user.groups.all():
-            if group.name == group_name:
-                return True
-        return False
-
     def get_is_reviewer(self, user):
-        return self.user_in_group(user, REVIEWER_GROUP)
\ No newline at end of file
+        return user_is_reviewer(user)
@@ -1,2 +1,8 @@
 from .rest_tests import *  # noqa
 from .map_data_points_tests import *
+from .outbox_tests import *  # noqa
+from .query_plan_tests import *  # noqa
+from .benchmark_tests import *  # noqa
+from .query_budget_tests import *  # noqa
+from .live_tests import *  # noqa
+from .tile_cache_tests import *  # noqa
@@ -1,8 +1,21 @@
+from contextlib import contextmanager
+
 from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
+from feedback_map.tag_registry import tag_registry
+
 
 class FVHAPITestCase(APITestCase):
+    def setUp(self):
+        # Caches outlive the test transactions, so start each test with a clean slate:
+        for cache in caches.all():
+            cache.clear()
+        tag_registry.invalidate()
+
     def assert_dict_contains(self, superset, subset, path=''):
         for key, expected in subset.items():
             full_path = path + key
@@ -14,6 +27,18 @@ class FVHAPITestCase(APITestCase):
                     full_path, expected, received
                 )
 
+    @contextmanager
+    def assert_max_queries(self, budget):
+        """
+        Fail if the block runs more than `budget` database queries, listing the queries that were run.
+        """
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        queries = [query["sql"] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), budget, f"{len(queries)} queries exceed the budget of {budget}:\n" + "\n".join(queries)
+        )
+
     def create_user(self):
         return User.objects.create(
                 username='courier', first_name='Coranne', last_name='Courier', email='coranne@couriersrus.com')
@@ -0,0 +1,67 @@
+import json
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from .base import FVHAPITestCase
+from feedback_map import models
+from feedback_map.benchmark.data import BENCHMARK_DEVICE_ID
+
+
+@mock.patch.dict(os.environ, {"IOTDEVICE_TOKEN": "test-token"})
+class BenchmarkTests(FVHAPITestCase):
+    def test_benchmark_command(self):
+        # Given that no data exists
+        # When running the benchmark command with a small synthetic data set
+        out = StringIO()
+        call_command("benchmark", generate=50, batch_size=20, repeat=3, warmup=1, stdout=out, stderr=StringIO())
+
+        # Then the data is generated
+        self.assertEqual(models.MapDataPoint.objects.filter(device_id=BENCHMARK_DEVICE_ID).count(), 50 + 4)
+        self.assertTrue(models.MapDataPointComment.objects.exists())
+        self.assertTrue(models.MapDataPointUpvote.objects.exists())
+
+        # And all endpoints are timed successfully
+        results = json.loads(out.getvalue())
+        self.assertEqual(
+            set(results["scenarios"].keys()),
+            {
+                "list",
+                "list_bbox",
+                "list_coordinates",
+                "geojson",
+                "geojson_bbox",
+                "detail",
+                "comments",
+                "notifications",
+                "iotdevice",
+            },
+        )
+        for name, result in results["scenarios"].items():
+            self.assertEqual(result["status"], [201] if name == "iotdevice" else [200], name)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["queries"], 0)
+            self.assertGreater(result["peak_rss_kb"], 0)
+
+        # And serialization throughput is measured
+        self.assertEqual(results["serialization"]["rows"], 54)
+        self.assertGreater(results["serialization"]["fast_serializer_rows_per_s"], 0)
+
+    def test_benchmark_command_clears_data(self):
+        # When running the benchmark command with --clear
+        call_command(
+            "benchmark",
+            generate=10,
+            repeat=1,
+            warmup=0,
+            only=["detail"],
+            clear=True,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+        # Then the generated data is gone
+        self.assertFalse(models.MapDataPoint.objects.filter(device_id=BENCHMARK_DEVICE_ID).exists())
+        self.assertFalse(models.Tag.objects.exists())
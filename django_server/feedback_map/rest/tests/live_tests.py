@@ -0,0 +1,82 @@
+import json
+
+from asgiref.sync import async_to_sync
+
+from .base import FVHAPITestCase
+from feedback_map import models
+from feedback_map.live import NoteFeed, Subscription, live_notes
+
+
+class LiveFeedTests(FVHAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.inside = models.MapDataPoint.objects.create(lat="60.17", lon="24.95", comment="Inside")
+        self.outside = models.MapDataPoint.objects.create(lat="61.5", lon="23.76", comment="Outside")
+
+    def change(self, event, note, **kwargs):
+        # As sent by the feedback_map_notify_note trigger
+        return {
+            "event": event,
+            "id": note.id,
+            "lon": float(note.lon),
+            "lat": float(note.lat),
+            "moved_from": None,
+            "change_seq": note.change_seq,
+            **kwargs,
+        }
+
+    def received(self, subscription):
+        events = []
+        while not subscription.events.empty():
+            lines = subscription.events.get_nowait().decode().strip().split("\n")
+            fields = dict(line.split(": ", 1) for line in lines)
+            events.append((fields["event"], json.loads(fields["data"])))
+        return events
+
+    def test_publish_filters_by_bbox(self):
+        # Given a client subscribed to all notes and another one to a bbox around one of the notes
+        feed = NoteFeed()
+        everything, bbox = Subscription(), Subscription((24.9, 60.1, 25.0, 60.2))
+        feed.subscriptions.update([everything, bbox])
+
+        # When notes are created, updated, hidden and moved out of the bbox
+        self.outside.visible = False
+        self.outside.save()
+        async_to_sync(feed.publish)(
+            [
+                self.change("created", self.inside),
+                self.change("updated", self.outside),
+                self.change("hidden", self.outside, moved_from=[24.95, 60.17]),
+            ]
+        )
+
+        # Then the notes are sent in the same format as in the list
+        listed = self.client.get("/rest/map_data_points/").json()["results"]
+        self.assertEqual(self.received(everything), [("created", listed[0]), ("hidden", {"id": self.outside.id})])
+        # And the bbox subscription gets only the changes within the bbox
+        self.assertEqual(self.received(bbox), [("created", listed[0]), ("hidden", {"id": self.outside.id})])
+
+    def test_slow_client_is_disconnected(self):
+        # Given a client with a full queue
+        subscription = Subscription()
+        for i in range(subscription.events.maxsize):
+            subscription.send(b"event")
+
+        # When one more event is sent
+        subscription.send(b"event")
+
+        # Then the client is told to disconnect
+        self.assertEqual(subscription.events.get_nowait(), None)
+
+    def test_invalid_bbox(self):
+        # When connecting with an invalid bbox
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/rest/map_data_points/live/", "query_string": b"bbox=1,2"}
+        async_to_sync(live_notes)(scope, None, send)
+
+        # Then the request is rejected
+        self.assertEqual(messages[0]["status"], 400)
@@ -1,14 +1,28 @@
+import json
 import os
+from datetime import timedelta
+from io import BytesIO
 
+from PIL import Image
 from django.contrib.auth.models import Group, User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 
 from .base import FVHAPITestCase
 from feedback_map import models
+from feedback_map.benchmark.serialization import generic_representation
+from feedback_map.models.map_data_points import IMAGE_READY
 from feedback_map.rest.permissions import REVIEWER_GROUP
+from feedback_map.rest.renderers import ORJSONRenderer
+from feedback_map.rest.serializers import DictMapDataPointSerializer
+from feedback_map.rest.views.map_data_points import cluster_map_data_points
+from feedback_map.tag_registry import tag_registry
 
 
 class MapDataPointsTests(FVHAPITestCase):
@@ -123,6 +137,29 @@ class MapDataPointsTests(FVHAPITestCase):
         self.assertSetEqual(set(note.tags), set(["Smelly"]))
         self.assertEqual(note.device_id, "dev_1234")
 
+    def test_save_map_data_point_with_button_position_as_multipart(self):
+        # Given a published Tag with button position field defined
+        models.Tag.objects.create(tag="Smelly", button_position=1, published=timezone.now())
+
+        # When requesting to save a Map Data Point with a multipart post, giving the button position as a string
+        url = reverse("mapdatapoint-list")
+        fields = {"lat": "60.16134701761975", "lon": "24.944593941327188", "button_position": "1"}
+        response = self.client.post(url, data=fields, format="multipart")
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # And it creates tags based on given button position:
+        self.assertEqual(models.MapDataPoint.objects.get().tags, ["Smelly"])
+
+        # When giving a button position that is not a number
+        fields["button_position"] = "first"
+        response = self.client.post(url, data=fields, format="multipart")
+
+        # Then a bad request response is received:
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("button_position", response.json())
+
     def test_update_map_data_point_tags(self):
         # Given that a user is signed in
         user = self.create_and_login_user()
@@ -228,6 +265,44 @@ class MapDataPointsTests(FVHAPITestCase):
         #  self.assertSetEqual(set(response.json()['downvotes']), set([user.id]))
         self.assertSetEqual(set(note.downvotes.values_list("user_id", flat=True)), set([user.id]))
 
+        # And the vote counts are up to date:
+        self.assert_dict_contains(response.json(), {"upvote_count": 0, "downvote_count": 1})
+
+    def test_vote_counts(self):
+        # Given that some users have voted on a Map Data Point
+        user = self.create_and_login_user()
+        other_users = [User.objects.create(username=f"user{i}") for i in range(3)]
+        note = models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188")
+        other_note = models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188")
+        for other_user in other_users:
+            note.vote(other_user, upvote=True)
+        other_note.vote(other_users[0], upvote=False)
+
+        # When upvoting the note twice over ReST
+        url = reverse("mapdatapoint-upvote", kwargs={"pk": note.id})
+        self.client.put(url)
+        response = self.client.put(url)
+
+        # Then the vote is counted once:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_dict_contains(response.json(), {"upvote_count": 4, "downvote_count": 0})
+        self.assertEqual(note.upvotes.filter(user=user).count(), 1)
+
+        # And when a voter is deleted
+        other_users[0].delete()
+
+        # Then their votes are no longer counted:
+        note.refresh_from_db()
+        other_note.refresh_from_db()
+        self.assertEqual((note.upvote_count, other_note.downvote_count), (3, 0))
+
+        # And the notes can be sorted and filtered by popularity:
+        url = reverse("mapdatapoint-list")
+        response = self.client.get(url, {"ordering": "-upvote_count", "upvote_count_min": 0})
+        self.assertEqual([result["id"] for result in response.json()["results"]], [note.id, other_note.id])
+        response = self.client.get(url, {"upvote_count_min": 1})
+        self.assertEqual([result["id"] for result in response.json()["results"]], [note.id])
+
     def test_comment_on_map_data_point(self):
         # Given that a user is signed in
         self.create_and_login_user()
@@ -238,7 +313,8 @@ class MapDataPointsTests(FVHAPITestCase):
 
         # When requesting to comment the Map Data Point over ReST
         url = reverse("mapdatapointcomment-list")
-        response = self.client.post(url, {"map_data_point": note.id, "comment": "nice!"})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"map_data_point": note.id, "comment": "nice!"})
 
         # Then an OK response is received:
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -266,6 +342,72 @@ class MapDataPointsTests(FVHAPITestCase):
         note = models.MapDataPoint.objects.get()
         self.assertSetEqual(set(note.comments.values_list("comment", flat=True)), set([]))
 
+    def test_comment_notifications_fan_out(self):
+        # Given a Map Data Point created by a user, commented by another user and some reviewers
+        creator = User.objects.create(username="creator")
+        commenter = User.objects.create(username="commenter")
+        reviewers = [User.objects.create(username=f"reviewer{i}") for i in range(3)]
+        for reviewer in reviewers:
+            reviewer.groups.add(Group.objects.get_or_create(name=REVIEWER_GROUP)[0])
+        note = models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188", created_by=creator)
+        note.comments.create(user=commenter, comment="first")
+
+        # When a reviewer comments the note over ReST
+        self.client.force_login(reviewers[0])
+        url = reverse("mapdatapointcomment-list")
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, {"map_data_point": note.id, "comment": "on it"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Then no notifications are created before the transaction commits
+        self.assertFalse(models.MapDataPointCommentNotification.objects.exists())
+
+        # And once it commits, everyone but the reviewer commenting is notified once, with a constant number of queries
+        with self.assert_max_queries(3):
+            for callback in callbacks:
+                callback()
+        self.assertSetEqual(
+            set(models.MapDataPointCommentNotification.objects.values_list("user__username", flat=True)),
+            {"creator", "commenter", "reviewer1", "reviewer2"},
+        )
+        self.assertEqual(models.MapDataPointCommentNotification.objects.count(), 4)
+
+    def test_unread_notification_count(self):
+        # Given that a user has created a Map Data Point
+        user = self.create_and_login_user()
+        note = models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188", created_by=user)
+        url = reverse("mapdatapointcommentnotification-unread-count")
+
+        # And has no unread notifications
+        self.assertEqual(self.client.get(url).json(), {"count": 0})
+
+        # When other users comment the note
+        for i in range(3):
+            comment = note.comments.create(user=User.objects.create(username=f"user{i}"), comment="Nice")
+            comment.notify_users()
+
+        # Then the unread count is updated, without counting the notifications again
+        with self.assert_max_queries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {"count": 3})
+
+        # And when marking a notification seen, twice
+        notification = user.notifications.first()
+        for i in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(reverse("mapdatapointcommentnotification-mark-seen", kwargs={"pk": notification.id}))
+
+        # Then the unread count is decremented once
+        self.assertEqual(self.client.get(url).json(), {"count": 2})
+
+        # And when marking all notifications seen
+        response = self.client.put(reverse("mapdatapointcommentnotification-mark-all-seen"))
+
+        # Then the remaining ones are marked seen
+        self.assertEqual(response.json(), {"count": 2})
+        self.assertFalse(user.notifications.filter(seen__isnull=True).exists())
+        self.assertEqual(self.client.get(url).json(), {"count": 0})
+
     def test_map_data_points_as_geojson(self):
         # Given that there are some Map Data Points in the db
         note = models.MapDataPoint.objects.create(
@@ -298,6 +440,8 @@ class MapDataPointsTests(FVHAPITestCase):
                             "is_processed": False,
                             "created_at": props["created_at"],
                             "modified_at": props["modified_at"],
+                            "upvote_count": 0,
+                            "downvote_count": 0,
                         },
                     }
                 ],
@@ -319,3 +463,483 @@ class MapDataPointsTests(FVHAPITestCase):
 
         # And it does not contain the invisible notes:
         self.assertDictEqual(response.json(), {"type": "FeatureCollection", "features": []})
+
+    def test_map_data_points_as_vector_tiles(self):
+        # Given that there is a Map Data Point in the db
+        models.MapDataPoint.objects.create(
+            **{"lat": "60.16134701761975", "lon": "24.944593941327188", "comment": "Nice view"}
+        )
+
+        # When requesting the vector tile containing the note
+        url = reverse("map_data_points_tiles", kwargs={"z": 14, "x": 9327, "y": 4743})
+        response = self.client.get(url)
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+
+        # And it contains the note:
+        self.assertIn(b"Nice view", response.content)
+
+        # And when requesting a tile elsewhere
+        url = reverse("map_data_points_tiles", kwargs={"z": 14, "x": 9000, "y": 4000})
+        response = self.client.get(url)
+
+        # Then an empty tile is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b"")
+
+        # And when requesting a tile outside the tile grid
+        url = reverse("map_data_points_tiles", kwargs={"z": 1, "x": 2, "y": 0})
+        response = self.client.get(url)
+
+        # Then a 404 response is received:
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stream_map_data_points_as_geojson(self):
+        # Given that there are some Map Data Points in the db
+        models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188", comment="Nice view")
+        models.MapDataPoint.objects.create(lat="60.17", lon="24.96", comment="Ugly view")
+
+        # When requesting the notes within a bbox as streamed geojson
+        url = reverse("map_data_points_geojson")
+        response = self.client.get(url, {"bbox": "24.94,60.16,24.95,60.165", "stream": "true"})
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # And it contains the same geojson as the non-streamed response, limited to the notes within the bbox:
+        streamed = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([f["properties"]["comment"] for f in streamed["features"]], ["Nice view"])
+        response = self.client.get(url, {"bbox": "24.94,60.16,24.95,60.165"})
+        self.assertDictEqual(streamed, response.json())
+
+    def test_map_data_point_clusters(self):
+        # Given that there are some Map Data Points close to each other and one further away
+        for tags in [["Steps"], ["Steps", "Entrance"], []]:
+            models.MapDataPoint.objects.create(lat="60.1613", lon="24.9445", tags=tags)
+        far_away = models.MapDataPoint.objects.create(lat="60.2", lon="25.1", tags=["Entrance"])
+
+        # When requesting clusters at city-wide zoom
+        url = reverse("mapdatapoint-clusters")
+        response = self.client.get(url, {"zoom": 12})
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # And it contains the clusters with counts and tag breakdowns:
+        clusters = sorted(response.json(), key=lambda c: c["count"])
+        self.assertEqual(len(clusters), 2)
+        self.assert_dict_contains(clusters[0], {"count": 1, "id": far_away.id, "tags": {"Entrance": 1}})
+        self.assert_dict_contains(clusters[1], {"count": 3, "tags": {"Steps": 2, "Entrance": 1}})
+        self.assertAlmostEqual(clusters[1]["lat"], 60.1613)
+
+        # And when requesting clusters within a bbox
+        response = self.client.get(url, {"zoom": 12, "bbox": "25.0,60.1,25.2,60.3"})
+
+        # Then only the clusters within the bbox are received:
+        self.assertEqual([c["count"] for c in response.json()], [1])
+
+        # And when requesting clusters without a zoom level
+        response = self.client.get(url)
+
+        # Then a 400 response is received:
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_clusters_of_query_with_literal_percent_signs(self):
+        # Given Map Data Points whose comments do and don't contain their device id
+        models.MapDataPoint.objects.create(lat="60.1613", lon="24.9445", device_id="dev_1", comment="From dev_1")
+        models.MapDataPoint.objects.create(lat="60.1613", lon="24.9445", device_id="dev_2", comment="Nice view")
+
+        # When clustering a query whose SQL contains literal percent signs, i.e. LIKE '%%' || ... || '%%'
+        queryset = models.MapDataPoint.objects.filter(comment__contains=F("device_id"))
+        clusters = cluster_map_data_points(queryset, zoom=12)
+
+        # Then the query is clustered as is:
+        self.assertEqual([c["count"] for c in clusters], [1])
+
+    def test_cursor_pagination_of_map_data_points(self):
+        # Given that there are some Map Data Points in the db
+        notes = [models.MapDataPoint.objects.create(lat="60.16", lon="24.94", comment=str(i)) for i in range(5)]
+
+        # When requesting the notes with cursor pagination
+        url = reverse("mapdatapoint-list")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 2, "ordering": "created_at"})
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # And it contains the first page and a link to the next one:
+        self.assertEqual([n["id"] for n in response.json()["results"]], [n.id for n in notes[:2]])
+        self.assertIsNone(response.json()["previous"])
+
+        # And when following the next links
+        response = self.client.get(response.json()["next"])
+        self.assertEqual([n["id"] for n in response.json()["results"]], [n.id for n in notes[2:4]])
+        response = self.client.get(response.json()["next"])
+
+        # Then the rest of the notes are received:
+        self.assertEqual([n["id"] for n in response.json()["results"]], [notes[4].id])
+        self.assertIsNone(response.json()["next"])
+
+        # And when following the previous link
+        response = self.client.get(response.json()["previous"])
+
+        # Then the previous page is received:
+        self.assertEqual([n["id"] for n in response.json()["results"]], [n.id for n in notes[2:4]])
+
+    def test_bulk_create_map_data_points(self):
+        # Given that a user is signed in
+        user = self.create_and_login_user()
+
+        # When requesting to save several Map Data Points at once, one of them invalid
+        url = reverse("mapdatapoint-bulk")
+        notes = [
+            {"lat": "60.16134701761975", "lon": "24.944593941327188", "comment": "Nice view", "tags": ["Steps"]},
+            {"lat": "60.17", "comment": "No longitude"},
+            {"lat": "60.18", "lon": "24.95", "device_id": "dev_1234"},
+        ]
+        response = self.client.post(url, data=notes, format="json")
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # And it contains a result for each note:
+        results = response.json()
+        self.assertEqual([r["status"] for r in results], [201, 400, 201])
+        self.assertIn("lon", results[1]["errors"])
+
+        # And the valid notes are created in db with geometries and the user as creator:
+        created = models.MapDataPoint.objects.order_by("id")
+        self.assertEqual([n.id for n in created], [results[0]["data"]["id"], results[2]["data"]["id"]])
+        self.assertEqual(created[0].tags, ["Steps"])
+        self.assertEqual(created[1].geom.coords, (24.95, 60.18))
+        self.assertEqual(set(n.created_by_id for n in created), {user.id})
+
+        # And the created notes are queued for forwarding:
+        self.assertEqual(models.OutboxMessage.objects.filter(map_data_point__in=created).count(), 2)
+
+    def test_bulk_create_map_data_points_ignores_posted_creator(self):
+        # Given that a user is signed in
+        user = self.create_and_login_user()
+        other_user = User.objects.create(username="other")
+
+        # When requesting to save Map Data Points at once, claiming another user as their creator
+        url = reverse("mapdatapoint-bulk")
+        notes = [{"lat": "60.16", "lon": "24.94", "created_by": other_user.id}]
+        response = self.client.post(url, data=notes, format="json")
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["status"] for r in response.json()], [201])
+
+        # And the signed in user is the creator of the note:
+        note = models.MapDataPoint.objects.get()
+        self.assertEqual(note.created_by, user)
+        self.assertEqual(note.modified_by, user)
+
+    def test_button_positions_served_from_tag_registry(self):
+        # Given a published Tag with button position field defined
+        tag = models.Tag.objects.create(tag="Smelly", button_position=1, published=timezone.now())
+
+        # And given a Map Data Point with that tag
+        note = models.MapDataPoint.objects.create(lat="60.16", lon="24.94", tags=["Smelly"])
+
+        # When requesting the note over ReST
+        url = reverse("mapdatapoint-detail", kwargs={"pk": note.id})
+        response = self.client.get(url)
+
+        # Then its button position is included:
+        self.assertEqual(response.json()["button_position"], 1)
+
+        # And subsequent button position lookups do not query the db:
+        with self.assertNumQueries(0):
+            self.assertEqual(tag_registry.button_position(["Smelly"]), 1)
+            self.assertEqual(tag_registry.published_tag(1), "Smelly")
+
+        # And when the tag is moved to another button
+        tag.button_position = 2
+        tag.save()
+
+        # Then the change is reflected in further requests:
+        response = self.client.get(url)
+        self.assertEqual(response.json()["button_position"], 2)
+
+    def test_process_map_data_point_image_in_background(self):
+        # Given that a reviewer user is signed in
+        self.create_and_login_reviewer()
+
+        # And given a successfully created Map Data Point
+        note = models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188")
+
+        # When requesting to attach a rotated image to the note
+        image = Image.new("RGB", (20, 10))
+        exif = image.getexif()
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees clockwise
+        output = BytesIO()
+        image.save(output, format="JPEG", exif=exif)
+        uploaded_file = SimpleUploadedFile("image.jpg", output.getvalue(), content_type="image/jpeg")
+        url = reverse("mapdatapoint-detail", kwargs={"pk": note.id})
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(url, data={"image": uploaded_file}, format="multipart")
+
+        # Then an OK response is received:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # And the image is queued for processing after the request:
+        note.refresh_from_db()
+        self.assertEqual(note.image_status, "PENDING")
+
+        # And when the background processing runs
+        for callback in callbacks:
+            callback()
+
+        # Then the image has been rotated:
+        note.refresh_from_db()
+        self.assertEqual(note.image_status, "READY")
+        with note.image.open("rb") as file:
+            self.assertEqual(Image.open(file).size, (10, 20))
+
+        # And downscaled versions of it are included when the note is fetched over ReST:
+        response = self.client.get(url)
+        variants = response.json()["image_variants"]
+        self.assertEqual(set(variants.keys()), {"256", "768", "1600"})
+        self.assertTrue(variants["256"]["webp"].endswith(f"map_data_points/{note.id}/image_256.webp"))
+        self.assertTrue(note.image.storage.exists(f"map_data_points/{note.id}/image_256.jpeg"))
+
+        # And when subsequently saving the note without touching the image
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.put(reverse("mapdatapoint-mark-processed", kwargs={"pk": note.id}))
+
+        # Then the image is not processed again:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(callbacks, [])
+
+    def test_recent_mappers(self):
+        # Given that some users have created Map Data Points, over ReST and in bulk
+        busy, occasional, idle = [User.objects.create(username=name) for name in ["busy", "occasional", "idle"]]
+        self.client.force_login(busy)
+        url = reverse("mapdatapoint-list")
+        for i in range(2):
+            self.client.post(url, {"lat": "60.16134701761975", "lon": "24.944593941327188", "comment": "Nice"})
+        self.client.post(
+            reverse("mapdatapoint-bulk"),
+            [{"lat": "60.16134701761975", "lon": "24.944593941327188"}] * 2,
+            format="json",
+        )
+        models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188", created_by=occasional)
+
+        # And an old note has been deleted
+        deleted = models.MapDataPoint.objects.create(lat="60.16", lon="24.94", created_by=idle)
+        deleted.delete()
+
+        # When requesting the recent mappers
+        url = reverse("user-list")
+        with self.assert_max_queries(3):
+            response = self.client.get(url)
+
+        # Then the users who have created notes are listed, the most active first:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(mapper["username"], mapper["note_count"]) for mapper in response.json()],
+            [("busy", 4), ("occasional", 1)],
+        )
+
+        # And when requesting them ordered by username
+        response = self.client.get(url, {"ordering": "username"})
+        self.assertEqual([mapper["username"] for mapper in response.json()], ["busy", "occasional"])
+
+        # And when their activity is outside the requested window
+        models.MapperActivity.objects.filter(user=occasional).update(date=timezone.localdate() - timedelta(days=8))
+        response = self.client.get(url, {"days": 7})
+        self.assertEqual([mapper["username"] for mapper in response.json()], ["busy"])
+
+    def test_fast_list_serialization_matches_drf(self):
+        # Given Map Data Points with all kinds of values
+        user = User.objects.create(username="mapper")
+        models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188")
+        models.MapDataPoint.objects.create(
+            lat="-60.1",
+            lon="-24.9",
+            comment='Ääkköset \u2028 "quoted"',
+            tags=["Steps", "Entrance"],
+            created_by=user,
+            processed_by=user,
+            image="map_data_points/1/image.jpg",
+            image_status=IMAGE_READY,
+        )
+        models.MapDataPoint.objects.create(lat="0", lon="0", image="map_data_points/1/image.jpg", comment="")
+        rows = list(models.MapDataPoint.objects.values())
+        with timezone.override("UTC"):
+            serializer = DictMapDataPointSerializer()
+
+            # When serializing and rendering them with the fast path
+            fast = ORJSONRenderer().render([serializer.to_representation(row) for row in rows])
+
+            # Then the result is byte for byte the same as with DRF's field-by-field serialization and JSONRenderer
+            generic = JSONRenderer().render([generic_representation(serializer, row) for row in rows])
+        self.assertEqual(fast, generic)
+        self.assertIn(b'Z"', fast)
+
+        # And the same holds in the default time zone
+        serializer = DictMapDataPointSerializer()
+        self.assertEqual(
+            ORJSONRenderer().render(DictMapDataPointSerializer(rows, many=True).data),
+            JSONRenderer().render([generic_representation(serializer, row) for row in rows]),
+        )
+
+    def test_sparse_fieldsets(self):
+        # Given that there is a Map Data Point in the db
+        note = models.MapDataPoint.objects.create(
+            lat="60.16134701761975", lon="24.944593941327188", comment="Nice view", tags=["Steps"]
+        )
+
+        # When requesting only some of the fields of the notes
+        url = reverse("mapdatapoint-list")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {"fields": "id,lat,lon,tags"})
+
+        # Then only those fields are returned:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()["results"], [{"id": note.id, "lat": "60.16134702", "lon": "24.94459394", "tags": ["Steps"]}]
+        )
+
+        # And only the corresponding columns are read from the db:
+        select = context.captured_queries[-1]["sql"]
+        self.assertNotIn('"comment"', select)
+        self.assertNotIn('"geom"', select)
+
+        # And the geometry columns are not read for full lists either
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {"pagination": "cursor"})
+        self.assertIn("comment", response.json()["results"][0])
+        self.assertNotIn('"geom"', context.captured_queries[-1]["sql"])
+        self.assertNotIn('"hidden_reason"', context.captured_queries[-1]["sql"])
+
+        # And when requesting only some of the properties of the GeoJSON features
+        response = self.client.get(reverse("map_data_points_geojson"), {"fields": "id,is_processed"})
+
+        # Then the features only have those properties
+        self.assertEqual(
+            response.json()["features"][0],
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [24.94459394, 60.16134702]},
+                "properties": {"id": note.id, "is_processed": False},
+            },
+        )
+
+        # And when requesting an unknown field
+        response = self.client.get(url, {"fields": "id,hidden_reason"})
+
+        # Then a 400 response is received
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nearest_map_data_points(self):
+        # Given notes at increasing distances east of a position, and one closer by to the north
+        url = reverse("mapdatapoint-list")
+        east = [
+            models.MapDataPoint.objects.create(lat="60.17", lon=f"24.9{i}", comment=f"east {i}", tags=["Steps"])
+            for i in range(5, 9)
+        ]
+        north = models.MapDataPoint.objects.create(lat="60.2", lon="24.95", comment="north", status="CLOSED")
+
+        # When requesting the nearest notes
+        response = self.client.get(url, {"nearest": "60.17,24.94", "limit": 4})
+
+        # Then the closest ones are returned, closest first, using true distances: 0.04 degrees of longitude east is
+        # closer than 0.03 degrees of latitude north
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([note["id"] for note in response.json()["results"]], [note.id for note in east])
+
+        # And when combining with tag and status filters
+        response = self.client.get(url, {"nearest": "60.2,24.95", "limit": 2, "tags": "Steps,Other", "status": "NEW"})
+
+        # Then only matching notes are returned
+        self.assertEqual([note["id"] for note in response.json()["results"]], [east[0].id, east[1].id])
+        response = self.client.get(url, {"nearest": "60.2,24.95", "status": "CLOSED,OPEN"})
+        self.assertEqual([note["id"] for note in response.json()["results"]], [north.id])
+
+        # And when the position is invalid
+        response = self.client.get(url, {"nearest": "60.2"})
+
+        # Then a 400 response is received
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_changes(self):
+        # Given a client that has synced some Map Data Points
+        url = reverse("mapdatapoint-changes")
+        kept, hidden, deleted = [
+            models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188", comment=comment)
+            for comment in ["kept", "hidden", "deleted"]
+        ]
+        response = self.client.get(url, {"since": 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.json()
+        self.assertEqual([note["comment"] for note in result["changes"]], ["kept", "hidden", "deleted"])
+        self.assertEqual((result["deleted"], result["more"]), ([], False))
+
+        # When notes are subsequently created, modified, hidden and deleted
+        created = models.MapDataPoint.objects.create(lat="60.16", lon="24.94", comment="created")
+        kept.comment = "modified"
+        kept.save()
+        hidden.visible = False
+        hidden.save()
+        deleted_id = deleted.id
+        deleted.delete()
+
+        # Then the client gets only those changes when syncing from the previous token, in pages of `limit`
+        response = self.client.get(url, {"since": result["next"], "limit": 3})
+        page = response.json()
+        self.assertEqual([note["id"] for note in page["changes"]], [created.id, kept.id])
+        self.assertEqual(page["changes"][1]["comment"], "modified")
+        self.assertEqual(page["deleted"], [hidden.id])
+        self.assertTrue(page["more"])
+        response = self.client.get(url, {"since": page["next"], "limit": 3, "fields": "id"})
+        page = response.json()
+        self.assertEqual((page["changes"], page["deleted"], page["more"]), ([], [deleted_id], False))
+
+        # And nothing when already up to date
+        response = self.client.get(url, {"since": page["next"]})
+        self.assertEqual(response.json(), {"changes": [], "deleted": [], "next": page["next"], "more": False})
+
+    def test_conditional_requests(self):
+        # Given a client that has fetched the Map Data Points, GeoJSON and tags
+        note = models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188", comment="first")
+        tag = models.Tag.objects.create(tag="Broken", published=timezone.now())
+        urls = [reverse("mapdatapoint-list"), reverse("map_data_points_geojson"), reverse("tag-list")]
+        etags = {url: self.client.get(url)["ETag"] for url in urls}
+
+        # When fetching them again with the ETags
+        for url in urls:
+            with self.assert_max_queries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+
+            # Then they are not modified, and found out without querying the data
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etags[url])
+
+        # And when fetching with other filters
+        response = self.client.get(urls[0], {"fields": "id"}, HTTP_IF_NONE_MATCH=etags[urls[0]])
+
+        # Then the data is returned
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # And when the data has changed
+        note.vote(self.create_user())
+        tag.color = "green"
+        tag.save()
+        for url in urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+
+            # Then the new data is returned
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertNotEqual(response["ETag"], etags[url])
+
+        # And also after a note is deleted
+        etag = self.client.get(urls[1])["ETag"]
+        note.delete()
+        response = self.client.get(urls[1], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["features"], [])
@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+import httpx
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from .base import FVHAPITestCase
+from feedback_map import models
+from feedback_map.forwarding import forward_pending_messages, prune_sent_messages
+
+
+@override_settings(IOT_FEEDBACK_API_URL="https://iot-feedback-api.example.com/iot/send_data/")
+class OutboxTests(FVHAPITestCase):
+    def test_forward_map_data_point_through_outbox(self):
+        # Given that a Map Data Point has been saved over ReST
+        url = reverse("mapdatapoint-list")
+        response = self.client.post(url, data={"lat": "60.16", "lon": "24.94", "comment": "Nice view"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Then it is queued for forwarding instead of being sent within the request:
+        message = models.OutboxMessage.objects.get()
+        self.assertEqual(message.destination, "http")
+        self.assertEqual(message.payload["comment"], "Nice view")
+        self.assertIsNone(message.sent_at)
+
+        # And when the forwarder runs while the upstream API is failing
+        requests = []
+
+        def failing_api(request):
+            requests.append(request)
+            return httpx.Response(503)
+
+        forward_pending_messages(http_client=httpx.Client(transport=httpx.MockTransport(failing_api)))
+
+        # Then the message is scheduled for a retry:
+        message.refresh_from_db()
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(message.attempts, 1)
+        self.assertIsNone(message.sent_at)
+        self.assertGreater(message.next_attempt_at, message.created_at)
+
+        # And when the forwarder runs again once the retry is due and the upstream API is working
+        models.OutboxMessage.objects.update(next_attempt_at=message.created_at)
+        client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+        forward_pending_messages(http_client=client)
+
+        # Then the message is marked as sent:
+        message.refresh_from_db()
+        self.assertIsNotNone(message.sent_at)
+
+    def test_messages_are_leased_while_sending(self):
+        # Given a queued message
+        note = models.MapDataPoint.objects.create(lat="60.16", lon="24.94")
+        message = models.OutboxMessage.objects.get(map_data_point=note)
+
+        # When the forwarder is sending it
+        leased = []
+
+        def api(request):
+            leased.append(models.OutboxMessage.objects.get(id=message.id).next_attempt_at)
+            # Then another forwarder doesn't pick it up meanwhile:
+            self.assertEqual(forward_pending_messages(), 0)
+            return httpx.Response(200)
+
+        forward_pending_messages(http_client=httpx.Client(transport=httpx.MockTransport(api)))
+
+        # As it is leased to the first forwarder:
+        self.assertGreater(leased[0], timezone.now())
+
+        # And it is marked as sent afterwards:
+        message.refresh_from_db()
+        self.assertIsNotNone(message.sent_at)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_failing_message_gives_way_after_max_attempts(self):
+        # Given a note with two queued changes, the first of which the upstream API keeps rejecting
+        note = models.MapDataPoint.objects.create(lat="60.16", lon="24.94", comment="Poison")
+        note.comment = "Fine"
+        note.save()
+        poison, later = models.OutboxMessage.objects.filter(map_data_point=note).order_by("id")
+
+        def api(request):
+            return httpx.Response(400 if b"Poison" in request.content else 200)
+
+        client = httpx.Client(transport=httpx.MockTransport(api))
+
+        # When the forwarder has tried the first one as many times as allowed
+        for i in range(2):
+            forward_pending_messages(http_client=client)
+            models.OutboxMessage.objects.filter(sent_at__isnull=True).update(next_attempt_at=timezone.now())
+
+        # Then it is marked failed and left unsent:
+        poison.refresh_from_db()
+        self.assertEqual(poison.attempts, 2)
+        self.assertIsNotNone(poison.failed_at)
+        self.assertIsNone(poison.sent_at)
+
+        # And the later change to the note is sent on the next run:
+        forward_pending_messages(http_client=client)
+        later.refresh_from_db()
+        self.assertIsNotNone(later.sent_at)
+        poison.refresh_from_db()
+        self.assertEqual(poison.attempts, 2)
+
+    @override_settings(OUTBOX_RETENTION_DAYS=7)
+    def test_prune_sent_messages(self):
+        # Given an old sent message, a recently sent message and an unsent message
+        note = models.MapDataPoint.objects.create(lat="60.16", lon="24.94")
+        old = models.OutboxMessage.objects.get(map_data_point=note)
+        old.sent_at = timezone.now() - timedelta(days=8)
+        old.save()
+        recent = models.OutboxMessage.objects.create(
+            map_data_point=note, destination="http", payload={}, sent_at=timezone.now() - timedelta(days=6)
+        )
+        unsent = models.OutboxMessage.objects.create(map_data_point=note, destination="http", payload={})
+
+        # When pruning sent messages
+        deleted = prune_sent_messages()
+
+        # Then only the old sent message is deleted:
+        self.assertEqual(deleted, 1)
+        self.assertSetEqual(set(models.OutboxMessage.objects.values_list("id", flat=True)), {recent.id, unsent.id})
@@ -0,0 +1,145 @@
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from .base import FVHAPITestCase
+from feedback_map import models
+from feedback_map.middleware import QueryStats, query_fingerprint
+from feedback_map.rest.permissions import REVIEWER_GROUP, user_is_reviewer
+
+
+class QueryBudgetTests(FVHAPITestCase):
+    """
+    Endpoints must run a constant number of queries no matter how many items they return.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create(username=f"user{i}") for i in range(5)]
+        self.notes = [
+            models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188", created_by=user)
+            for user in self.users
+        ]
+        for user in self.users:
+            models.MapDataPointComment.objects.create(map_data_point=self.notes[0], user=user, comment="Nice")
+
+    def create_and_login_reviewer(self):
+        user = User.objects.create(username="reviewer")
+        user.groups.add(Group.objects.get_or_create(name=REVIEWER_GROUP)[0])
+        self.client.force_login(user)
+        return user
+
+    def test_map_data_points_list_query_budget(self):
+        with self.assert_max_queries(3):
+            response = self.client.get(reverse("mapdatapoint-list"))
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_map_data_point_detail_query_budget(self):
+        with self.assert_max_queries(3):
+            response = self.client.get(reverse("mapdatapoint-detail", kwargs={"pk": self.notes[0].id}))
+        self.assertEqual(len(response.json()["comments"]), 5)
+
+    def test_map_data_points_geojson_query_budget(self):
+        with self.assert_max_queries(3):
+            response = self.client.get(reverse("map_data_points_geojson"))
+        self.assertEqual(len(response.json()["features"]), 5)
+
+    def test_comments_query_budget(self):
+        self.create_and_login_reviewer()
+        with self.assert_max_queries(6):
+            response = self.client.get(reverse("mapdatapointcomment-list"))
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_notifications_query_budget(self):
+        user = self.create_and_login_user()
+        for comment in models.MapDataPointComment.objects.all():
+            comment.notifications.create(user=user)
+        with self.assert_max_queries(5):
+            response = self.client.get(reverse("mapdatapointcommentnotification-list"))
+        self.assertEqual(len(response.json()["results"]), 5)
+
+
+class GroupMembershipCacheTests(FVHAPITestCase):
+    def test_group_memberships_are_fetched_once(self):
+        # Given a reviewer
+        reviewer = User.objects.create(username="reviewer")
+        reviewer.groups.add(Group.objects.get_or_create(name=REVIEWER_GROUP)[0])
+
+        # When checking the membership several times
+        user = User.objects.get(id=reviewer.id)
+        with self.assert_max_queries(1):
+            for _ in range(3):
+                self.assertTrue(user_is_reviewer(user))
+
+        # Then it is also shared with later requests
+        with self.assert_max_queries(0):
+            self.assertTrue(user_is_reviewer(User(id=reviewer.id)))
+
+    def test_group_membership_changes_invalidate_cache(self):
+        # Given a cached membership of a reviewer
+        group = Group.objects.get_or_create(name=REVIEWER_GROUP)[0]
+        reviewer = User.objects.create(username="reviewer")
+        reviewer.groups.add(group)
+        self.assertTrue(user_is_reviewer(User.objects.get(id=reviewer.id)))
+
+        # When removing them from the group
+        reviewer.groups.remove(group)
+
+        # Then they are no longer a reviewer
+        self.assertFalse(user_is_reviewer(User.objects.get(id=reviewer.id)))
+
+        # And when adding them back through the group and clearing the group
+        group.user_set.add(reviewer)
+        self.assertTrue(user_is_reviewer(User.objects.get(id=reviewer.id)))
+        group.user_set.clear()
+
+        # Then the change is seen too
+        self.assertFalse(user_is_reviewer(User.objects.get(id=reviewer.id)))
+
+    def test_review_permissions_check_groups_once(self):
+        # Given a reviewer and a note created by someone else
+        reviewer = User.objects.create(username="reviewer")
+        reviewer.groups.add(Group.objects.get_or_create(name=REVIEWER_GROUP)[0])
+        note = models.MapDataPoint.objects.create(lat="60.16134701761975", lon="24.944593941327188")
+        self.client.force_login(reviewer)
+
+        # When the reviewer hides the note
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(reverse("mapdatapoint-hide-note", kwargs={"pk": note.id}))
+
+        # Then their groups are fetched at most once
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        group_queries = [query for query in context.captured_queries if "auth_user_groups" in query["sql"]]
+        self.assertLessEqual(len(group_queries), 1)
+
+
+class QueryStatsTests(FVHAPITestCase):
+    def test_query_fingerprint(self):
+        self.assertEqual(
+            query_fingerprint('SELECT "id" FROM "note" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            query_fingerprint('SELECT "id" FROM "note" WHERE "id" IN (%s) LIMIT 21'),
+        )
+
+    def test_duplicated_queries_are_detected(self):
+        # When running the same query for different objects
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            for user_id in [1, 2, 3]:
+                User.objects.filter(id=user_id).exists()
+            models.Tag.objects.exists()
+
+        # Then the queries are counted and the repeated one is reported
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(list(stats.duplicates().values()), [3])
+
+    @override_settings(DB_QUERY_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        # When requesting notes over ReST
+        response = self.client.get(reverse("mapdatapoint-list"))
+
+        # Then the database time and query count are included in the Server-Timing header
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=\d+\.\d;desc="\d+ queries, 0 duplicated"$')
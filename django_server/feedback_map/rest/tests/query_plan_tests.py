@@ -0,0 +1,70 @@
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .base import FVHAPITestCase
+from feedback_map import models, tile_cache
+from feedback_map.rest.views import MapDataPointsViewSet, MapDataPointCommentNotificationsViewSet
+
+
+class QueryPlanTests(FVHAPITestCase):
+    """
+    Check that the main query shapes of the ReST API can be answered using indexes. Test tables are tiny, so
+    sequential scans are disabled to see whether the planner has any index to fall back to.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def view_queryset(self, viewset_class, params):
+        view = viewset_class(action="list", format_kwarg=None, kwargs={})
+        view.request = Request(APIRequestFactory().get("/", params))
+        view.request.user = self.user
+        return view.filter_queryset(view.get_queryset())
+
+    def assert_no_seq_scan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan, plan)
+
+    def test_map_data_points_bbox_query_uses_index(self):
+        self.assert_no_seq_scan(
+            self.view_queryset(MapDataPointsViewSet, {"bbox": "24.95,60.165,24.96,60.175", "ordering": "created_at"})
+        )
+
+    def test_map_data_points_nearest_query_uses_index(self):
+        queryset = self.view_queryset(MapDataPointsViewSet, {"nearest": "60.166,24.951", "status": "NEW,OPEN"})
+        plan = queryset.explain()
+        # Either of the GiST indexes on geog may be used, as long as it returns the notes in distance order:
+        self.assertIn("Index Scan", plan, plan)
+        self.assertIn("Order By:", plan, plan)
+        self.assertNotIn("Seq Scan", plan, plan)
+        self.assertNotIn("Sort", plan, plan)
+
+    def test_tile_cache_query_uses_index(self):
+        tile = tile_cache.tile_of(24.95, 60.17, 14)
+        self.assert_no_seq_scan(tile_cache.notes_in_region(tile_cache.tile_bounds(*tile, 14)))
+
+    def test_map_data_points_radius_query_uses_index(self):
+        self.assert_no_seq_scan(self.view_queryset(MapDataPointsViewSet, {"coordinates": "60.166,24.951,1000"}))
+
+    def test_map_data_points_created_at_query_uses_index(self):
+        queryset = self.view_queryset(
+            MapDataPointsViewSet, {"created_at_after": "2023-01-01T00:00:00Z", "ordering": "-created_at"}
+        )
+        self.assert_no_seq_scan(queryset[:100])
+
+    def test_map_data_points_modified_at_query_uses_index(self):
+        queryset = self.view_queryset(
+            MapDataPointsViewSet, {"modified_at_after": "2023-01-01T00:00:00Z", "ordering": "modified_at"}
+        )
+        self.assert_no_seq_scan(queryset[:100])
+
+    def test_unseen_notifications_query_uses_index(self):
+        self.assert_no_seq_scan(self.view_queryset(MapDataPointCommentNotificationsViewSet, {})[:100])
+
+    def test_map_data_point_comments_query_uses_index(self):
+        note = models.MapDataPoint.objects.create(lat="60.16", lon="24.94")
+        self.assert_no_seq_scan(note.comments.all())
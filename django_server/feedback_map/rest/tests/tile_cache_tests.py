@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.urls import reverse
+
+from .base import FVHAPITestCase
+from feedback_map import models, tile_cache
+
+
+class TileCacheTests(FVHAPITestCase):
+    bbox = "24.94,60.16,24.96,60.18"
+
+    def setUp(self):
+        super().setUp()
+        self.inside = models.MapDataPoint.objects.create(lat="60.17", lon="24.95", comment="Inside")
+        self.nearby = models.MapDataPoint.objects.create(lat="60.175", lon="24.97", comment="Nearby")
+        self.far = models.MapDataPoint.objects.create(lat="61.5", lon="23.76", comment="Far")
+
+    def list_comments(self, **params):
+        response = self.client.get(reverse("mapdatapoint-list"), {"bbox": self.bbox, **params})
+        return [note["comment"] for note in response.json()["results"]]
+
+    def test_tiles(self):
+        # The tile of a position contains it
+        x, y = tile_cache.tile_of(24.95, 60.17, 14)
+        min_lon, min_lat, max_lon, max_lat = tile_cache.tile_bounds(x, y, 14)
+        self.assertTrue(min_lon <= 24.95 < max_lon and min_lat < 60.17 <= max_lat)
+        # And the tile at zoom 0 is the whole world
+        self.assertEqual(tile_cache.tile_of(-180, 85.1, 0), (0, 0))
+        self.assertEqual(tile_cache.tile_of(179.9, -85.1, 0), (0, 0))
+
+    def test_bbox_list_is_cached_per_tile(self):
+        # Given a bbox list that has been fetched once
+        self.assertEqual(self.list_comments(), ["Inside"])
+
+        # When fetching an overlapping bbox within the same tiles
+        with self.assert_max_queries(1):
+            comments = self.list_comments(bbox="24.945,60.165,24.955,60.175")
+
+        # Then the notes come from the cache, with only the ETag version queried from the db
+        self.assertEqual(comments, ["Inside"])
+        # And the GeoJSON gets the same notes
+        response = self.client.get(reverse("map_data_points_geojson"), {"bbox": self.bbox, "fields": "id"})
+        self.assertEqual(response.json()["features"][0]["properties"], {"id": self.inside.id})
+
+        # And the result is the same as from the db
+        self.assertEqual(self.list_comments(), self.list_comments(created_at_after="2000-01-01T00:00:00Z"))
+
+    def test_changes_invalidate_tiles(self):
+        # Given a cached bbox list
+        self.assertEqual(self.list_comments(), ["Inside"])
+
+        # When notes are moved into and out of the bbox, voted on and hidden
+        self.nearby.lon = "24.955"
+        self.nearby.save()
+        self.assertEqual(self.list_comments(), ["Inside", "Nearby"])
+        self.inside.lat = "61.0"
+        self.inside.save()
+        self.assertEqual(self.list_comments(), ["Nearby"])
+        moved = models.MapDataPoint.objects.get(id=self.inside.id)
+        moved.lat = "60.17"
+        moved.save()
+        self.assertEqual(self.list_comments(), ["Inside", "Nearby"])
+
+        self.nearby.vote(self.create_user())
+        response = self.client.get(reverse("mapdatapoint-list"), {"bbox": self.bbox})
+        self.assertEqual(response.json()["results"][0]["upvote_count"], 1)
+
+        self.nearby.visible = False
+        self.nearby.save()
+
+        # Then the changes are reflected right away
+        self.assertEqual(self.list_comments(), [])
+
+    def test_rows_read_before_a_change_are_not_used(self):
+        # Given a request reading the notes of a tile while a note in it is changed
+        fetch_tiles = tile_cache.fetch_tiles
+
+        def fetch_and_change(tiles, zoom):
+            rows = fetch_tiles(tiles, zoom)
+            self.inside.comment = "Changed"
+            self.inside.save()
+            return rows
+
+        with mock.patch.object(tile_cache, "fetch_tiles", fetch_and_change):
+            self.assertEqual(self.list_comments(), ["Inside"])
+
+        # Then the notes it read are not used afterwards
+        self.assertEqual(self.list_comments(), ["Changed"])
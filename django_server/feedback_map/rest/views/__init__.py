@@ -7,3 +7,4 @@ from .map_data_points import (
     IotDeviceView as IotDeviceView,
 )
 from .recent_mappers import RecentMappersViewSet as RecentMappersViewSet
+from .tiles import MapDataPointTilesView as MapDataPointTilesView
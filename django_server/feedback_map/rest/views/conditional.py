@@ -0,0 +1,40 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+
+class ConditionalListMixin:
+    """
+    Answer list requests with 304 Not Modified when the client already has the current data, without running the
+    list query.
+
+    The ETag is derived from `get_data_version()`, which must change whenever the data does and be cheap to get,
+    and the full request URL, which holds the filters, ordering, page etc. The data must be the same for all users.
+    Views that don't override `get_data_version()` respond as usual, without an ETag.
+    """
+
+    def get_data_version(self):
+        return None
+
+    def get_list_etag(self, request, version):
+        key = f"{version}:{request.accepted_renderer.format}:{request.get_full_path()}"
+        return '"{}"'.format(hashlib.md5(key.encode()).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def conditional_response(self, request, respond, *args, **kwargs):
+        """
+        Return 304 Not Modified if the client has the current version of the list, and respond(request, ...)
+        otherwise.
+        """
+        version = self.get_data_version()
+        if version is None:
+            return respond(request, *args, **kwargs)
+        etag = self.get_list_etag(request, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = respond(request, *args, **kwargs)
+        response["ETag"] = etag
+        patch_vary_headers(response, ["Accept"])
+        return response
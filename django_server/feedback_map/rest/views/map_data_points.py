@@ -3,24 +3,37 @@ import os
 
 import django_filters
 
-from feedback_map.models import Tag
 from django.contrib.gis.db.models.functions import GeometryDistance
 from django.contrib.gis.geos import Point, Polygon
 from django.contrib.gis.measure import Distance
 from rest_framework.request import Request
+from django.db import connections, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
 
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
-from feedback_map import models
+from feedback_map import models, notification_counts, tile_cache
+from feedback_map.background import run_after_commit
+from feedback_map.models.map_data_points import notify_comment_users
+from feedback_map.signals import map_data_points_bulk_created
+from feedback_map.tag_registry import tag_registry
+from feedback_map.rest.pagination import (
+    StandardResultsSetPagination,
+    SelectablePaginationMixin,
+    MapDataPointsKeysetPagination,
+    CommentsKeysetPagination,
+    NotificationsKeysetPagination,
+)
+from feedback_map.rest.renderers import dumps
 from feedback_map.rest.permissions import (
     IsReviewerOrCreator,
     IsReviewer,
@@ -33,6 +46,8 @@ from feedback_map.rest.serializers import (
     MapDataPointCommentNotificationSerializer,
     TagSerializer,
 )
+from .conditional import ConditionalListMixin
+from .tiles import MAX_ZOOM
 
 
 def create_polygon_or_fail(bbox: str) -> Polygon:
@@ -50,46 +65,210 @@ def create_polygon_or_fail(bbox: str) -> Polygon:
         raise ValidationError("Invalid bbox: {}".format(e))
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 100
-    page_size_query_param = "page_size"
-    max_page_size = 1000
+def filter_by_location(queryset, query_params):
+    """
+    Apply the bbox and coordinates+radius filters given in query params to a MapDataPoint queryset.
+    """
+    bbox = query_params.get("bbox")
+    if bbox:
+        geom = create_polygon_or_fail(bbox)
+        queryset = queryset.filter(geom__within=geom)
+    coordinates = query_params.get("coordinates")
+    if coordinates:
+        lat, lon, radius = [float(x) for x in coordinates.split(",")]
+        point = Point(lon, lat)
+        queryset = queryset.filter(geog__distance_lt=(point, Distance(m=radius)))
+        # Order queryset by distance
+        queryset = queryset.annotate(distance=GeometryDistance("geog", point)).order_by("distance")
+    return queryset
+
+
+def nearest_map_data_points(queryset, query_params, default_limit=20, max_limit=100):
+    """
+    Apply the `nearest=lat,lon&limit=N` query params to a MapDataPoint queryset: the N notes closest to the given
+    position, closest first. Use after all other filters, as the result is sliced.
+
+    Ordering by GeometryDistance with a LIMIT is answered by a KNN scan of the spatial index, which stops once it has
+    found N notes, so no radius is needed. The index on geog is used rather than the one on geom to get true
+    distances: at the latitude of Helsinki a degree of longitude is only half as long as a degree of latitude.
+    """
+    nearest = query_params.get("nearest")
+    if not nearest:
+        return queryset
+    try:
+        lat, lon = [float(x) for x in nearest.split(",")]
+        limit = int(query_params.get("limit", default_limit))
+    except ValueError:
+        raise ValidationError("nearest must be given as lat,lon and limit as an integer")
+    limit = min(max(limit, 1), max_limit)
+    point = Point(lon, lat, srid=4326)
+    return queryset.order_by(GeometryDistance("geog", point))[:limit]
+
+
+def requested_fields(query_params, serializer_class):
+    """
+    Return the list of field names given in the `fields` query param, or None to output all fields.
+    """
+    fields = [field.strip() for field in query_params.get("fields", "").split(",") if field.strip()]
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in serializer_class.Meta.fields]
+    if unknown:
+        raise ValidationError(
+            {"fields": f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(serializer_class.Meta.fields)}."}
+        )
+    return fields
+
+
+def note_as_feature(note, serializer):
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(note["lon"]), float(note["lat"])],
+        },
+        "properties": serializer.to_representation(note),
+    }
+
+
+# Notes are grouped by snapping their Web Mercator coordinates to a grid of CLUSTER_CELLS_PER_TILE x
+# CLUSTER_CELLS_PER_TILE cells per slippy map tile at the requested zoom level:
+CLUSTER_CELLS_PER_TILE = 4
+WEB_MERCATOR_WIDTH = 40075016.68557849
+
+# Follows a "WITH notes AS (...)" CTE selecting the ids of the notes to cluster:
+CLUSTER_SQL = """,
+cells AS (
+    SELECT
+        note.id,
+        note.tags,
+        note.lat,
+        note.lon,
+        floor(ST_X(ST_Transform(note.geom, 3857)) / %s) AS cell_x,
+        floor(ST_Y(ST_Transform(note.geom, 3857)) / %s) AS cell_y
+    FROM feedback_map_mapdatapoint note
+    WHERE note.geom IS NOT NULL AND note.id IN (SELECT id FROM notes)
+),
+clusters AS (
+    SELECT cell_x, cell_y, COUNT(*) AS count, AVG(lat) AS lat, AVG(lon) AS lon, MIN(id) AS id
+    FROM cells
+    GROUP BY cell_x, cell_y
+),
+tag_counts AS (
+    SELECT cell_x, cell_y, json_object_agg(tag, count) AS tags
+    FROM (
+        SELECT cell_x, cell_y, tag, COUNT(*) AS count
+        FROM cells, unnest(cells.tags) AS tag
+        GROUP BY cell_x, cell_y, tag
+    ) cell_tags
+    GROUP BY cell_x, cell_y
+)
+SELECT clusters.count, clusters.lat, clusters.lon, clusters.id, tag_counts.tags
+FROM clusters LEFT JOIN tag_counts USING (cell_x, cell_y)
+"""
+
+
+def cluster_map_data_points(queryset, zoom: int) -> list:
+    """
+    Group the notes in the given queryset into grid clusters suitable for display at the given zoom level.
+    """
+    notes = queryset.order_by().values("id")
+    notes_sql, notes_params = notes.query.get_compiler(using=notes.db).as_sql()
+    cell_size = WEB_MERCATOR_WIDTH / 2**zoom / CLUSTER_CELLS_PER_TILE
+    # The compiled notes query is used as is, with its parameters before those of CLUSTER_SQL:
+    with connections[notes.db].cursor() as cursor:
+        cursor.execute(f"WITH notes AS ({notes_sql})" + CLUSTER_SQL, [*notes_params, cell_size, cell_size])
+        rows = cursor.fetchall()
+    clusters = []
+    for count, lat, lon, note_id, tags in rows:
+        cluster = {"lat": float(lat), "lon": float(lon), "count": count, "tags": tags or {}}
+        if count == 1:
+            cluster["id"] = note_id
+        clusters.append(cluster)
+    return clusters
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
 
 
 class MapDataPointsFilter(django_filters.FilterSet):
+    # Notes with any of the given comma separated tags:
+    tags = CharInFilter(lookup_expr="overlap")
+    status = CharInFilter()
     created_at = django_filters.IsoDateTimeFromToRangeFilter()
     modified_at = django_filters.IsoDateTimeFromToRangeFilter()
+    upvote_count = django_filters.RangeFilter()
+    downvote_count = django_filters.RangeFilter()
 
     class Meta:
         model = models.MapDataPoint
-        fields = ["created_at", "modified_at"]
+        fields = ["tags", "status", "created_at", "modified_at", "upvote_count", "downvote_count"]
+
 
+class TileCacheMixin:
+    """
+    Serve lists of visible notes filtered by a bbox and nothing else from the tile cache, see
+    feedback_map.tile_cache. The notes are then ordered by id.
+    """
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+    # Query params that don't affect which notes are listed, or in which order:
+    tile_cacheable_params = {"bbox", "fields", "format", "page", "page_size"}
+
+    def use_tile_cache(self):
+        params = self.request.query_params
+        return bool(params.get("bbox")) and set(params) <= self.tile_cacheable_params
+
+    def filter_queryset(self, queryset):
+        if self.use_tile_cache():
+            notes = tile_cache.notes_in_bbox(create_polygon_or_fail(self.request.query_params["bbox"]).extent)
+            if notes is not None:
+                return notes
+        return super().filter_queryset(queryset)
+
+
+class TagsViewSet(ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
     serializer_class = TagSerializer
     pagination_class = StandardResultsSetPagination
     queryset = models.Tag.objects.filter(published__isnull=False).order_by("button_position")
 
+    def get_data_version(self):
+        return tag_registry.version()
+
 
-class MapDataPointsViewSet(viewsets.ModelViewSet):
+class MapDataPointsViewSet(ConditionalListMixin, TileCacheMixin, SelectablePaginationMixin, viewsets.ModelViewSet):
     """
     You can filter by:
 
     * `created_at_before`, `created_at_after`, `modified_at_before`, `modified_at_after`
        using ISO-formatted time strings.
+    * `upvote_count_min`, `upvote_count_max`, `downvote_count_min`, `downvote_count_max`
+    * `tags` = notes with any of the given comma separated tags, `status` = comma separated statuses
     * bbox = left,bottom,right,top = min Longitude, min Latitude, max Longitude, max Latitude
     * coordinates+radius = lon,lat,radius
+    * nearest=lat,lon and limit (20 by default, max 100) = the notes closest to the given position, closest first,
+      e.g. [?nearest=60.166,24.951&limit=20&status=NEW,OPEN](?nearest=60.166,24.951&limit=20&status=NEW,OPEN).
+      This overrides the ordering and returns a single page.
 
     You can order by
 
     * `[-]created_at`
     * `[-]modified_at`
+    * `[-]upvote_count`, `[-]downvote_count`
 
     Note that there is not default ordering, but distance ordering is used if you use coordinates+radius filter.
+    Lists filtered by nothing but bbox (and paged, with optional `fields`) are served from a per-tile cache and
+    ordered by id.
 
     You can request max 1000 items per page using `page_size=1000` query parameter.
 
+    Use e.g. `fields=id,lat,lon,tags` to list only some of the fields. This also limits the columns read from the db.
+
+    Use `pagination=cursor` to page with cursors on `(created_at, id)`, `(modified_at, id)` etc. instead of page
+    numbers, following the `next` links. This is much faster when walking through the whole history. Cursor
+    pagination uses its own ordering (`-created_at` by default), overriding distance ordering.
+
     Examples:
 
     * [?created_at_after=2023-01-01T00:00:00Z&ordering=created_at\
@@ -97,17 +276,24 @@ class MapDataPointsViewSet(viewsets.ModelViewSet):
     * [?bbox=24.95,60.165,24.96,60.175&ordering=-created_at](?bbox=24.95,60.165,24.96,60.175&ordering=-created_at)
     * [?coordinates=60.166,24.951,1000](?coordinates=60.166,24.951,1000)
     * [?ordering=created_at](?ordering=created_at)
+
+    The list has an ETag; send it back in `If-None-Match` to get an empty 304 Not Modified response if nothing has
+    changed.
     """
 
     permission_classes = [permissions.AllowAny]
     serializer_class = MapDataPointSerializer
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = MapDataPointsKeysetPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = MapDataPointsFilter
-    ordering_fields = ["created_at", "modified_at"]
+    ordering_fields = ["created_at", "modified_at", "upvote_count", "downvote_count"]
     # ordering = ["-created_at"]  # If default ordering is set, it is not possible to use ordering by distance
     queryset = models.MapDataPoint.objects.filter(visible=True)
 
+    max_bulk_size = 1000
+    max_changes = 1000
+
     # Use simple serializer for list to improve performance:
     serializer_classes = {"list": DictMapDataPointSerializer}
 
@@ -115,21 +301,30 @@ class MapDataPointsViewSet(viewsets.ModelViewSet):
         """
         GIS filtering - note usage of geometry and geography fields.
         """
-        queryset = super().get_queryset()
-        bbox = self.request.query_params.get("bbox")
-        if bbox:
-            geom = create_polygon_or_fail(bbox)
-            queryset = queryset.filter(geom__within=geom)
-        coordinates = self.request.query_params.get("coordinates")
-        if coordinates:
-            lat, lon, radius = [float(x) for x in coordinates.split(",")]
-            point = Point(lon, lat)
-            queryset = queryset.filter(geog__distance_lt=(point, Distance(m=radius)))
-            # Order queryset by distance
-            queryset = queryset.annotate(distance=GeometryDistance("geog", point)).order_by("distance")
+        queryset = filter_by_location(super().get_queryset(), self.request.query_params)
         if self.action == "list":
-            # Fetch list as dicts rather than object instances for a bit more speed:
-            return queryset.values()
+            # Fetch list as dicts rather than object instances for a bit more speed, and only the columns needed:
+            columns = DictMapDataPointSerializer.columns(self.get_requested_fields())
+            if self.use_cursor_pagination():
+                keys = ["id"] + self.cursor_pagination_class.ordering_fields
+                columns += [key for key in keys if key not in columns]
+            return queryset.values(*columns)
+        return queryset.prefetch_related(
+            Prefetch("comments", queryset=models.MapDataPointComment.objects.select_related("user"))
+        )
+
+    def get_data_version(self):
+        return models.MapDataPoint.latest_change_seq()
+
+    def use_tile_cache(self):
+        return self.action == "list" and super().use_tile_cache()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list" and "nearest" in self.request.query_params:
+            if self.use_cursor_pagination():
+                raise ValidationError("nearest can't be used with cursor pagination")
+            queryset = nearest_map_data_points(queryset, self.request.query_params)
         return queryset
 
     def get_permissions(self):
@@ -145,12 +340,19 @@ class MapDataPointsViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.serializer_class)
 
+    def get_serializer(self, *args, **kwargs):
+        if self.action == "list":
+            kwargs["fields"] = self.get_requested_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_requested_fields(self):
+        return requested_fields(self.request.query_params, DictMapDataPointSerializer)
+
     def perform_create(self, serializer):
-        map_data_point = serializer.save()
-        if not self.request.user.is_anonymous:
-            map_data_point.created_by = self.request.user
-            map_data_point.modified_by = self.request.user
-        map_data_point.save()
+        if self.request.user.is_anonymous:
+            serializer.save()
+        else:
+            serializer.save(created_by=self.request.user, modified_by=self.request.user)
 
     def perform_update(self, serializer):
         map_data_point = serializer.save()
@@ -174,30 +376,126 @@ class MapDataPointsViewSet(viewsets.ModelViewSet):
         map_data_point.save()
         return Response("OK")
 
+    @action(methods=["POST"], detail=False)
+    def bulk(self, request, *args, **kwargs):
+        """
+        Create up to 1000 notes at once. Takes a list of notes in the same format as creating a single note, without
+        images, and returns a result for each of them in the same order: `{"status": 201, "data": {...}}` for
+        created notes and `{"status": 400, "errors": {...}}` for invalid ones. Valid notes are created even if some
+        others are invalid.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError("Expected a list of notes")
+        if len(request.data) > self.max_bulk_size:
+            raise ValidationError(f"At most {self.max_bulk_size} notes can be created at once")
+
+        user = None if request.user.is_anonymous else request.user
+        serializers = [self.get_serializer(data=item) for item in request.data]
+        notes = []
+        for serializer in serializers:
+            if serializer.is_valid():
+                # The signed in user overrides any posted creator:
+                note = models.MapDataPoint(**{**serializer.validated_data, "created_by": user, "modified_by": user})
+                note.update_geometry()
+                notes.append(note)
+
+        with transaction.atomic():
+            notes = models.MapDataPoint.objects.bulk_create(notes)
+            map_data_points_bulk_created.send(sender=models.MapDataPoint, instances=notes)
+        prefetch_related_objects(notes, "comments")
+
+        results = []
+        created = iter(notes)
+        for serializer in serializers:
+            if serializer.errors:
+                results.append({"status": status.HTTP_400_BAD_REQUEST, "errors": serializer.errors})
+            else:
+                serializer.instance = next(created)
+                results.append({"status": status.HTTP_201_CREATED, "data": serializer.data})
+        return Response(results)
+
+    @action(methods=["GET"], detail=False)
+    def clusters(self, request, *args, **kwargs):
+        """
+        Visible notes grouped into clusters for display at the given `zoom` level (0 - 22). Supports the same
+        filters as the list, e.g. `?bbox=24.9,60.15,25.0,60.2&zoom=12`.
+
+        Returns a list of cluster centroids with the number of notes and the number of notes per tag in each
+        cluster. Clusters consisting of a single note also contain the id of the note.
+        """
+        try:
+            zoom = int(request.query_params["zoom"])
+        except (KeyError, ValueError):
+            raise ValidationError("zoom must be given as an integer")
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValidationError(f"zoom must be between 0 and {MAX_ZOOM}")
+        return Response(cluster_map_data_points(self.filter_queryset(self.get_queryset()), zoom))
+
+    @action(methods=["GET"], detail=False)
+    def changes(self, request, *args, **kwargs):
+        """
+        Changes to notes since the given change token, for keeping a local copy of all visible notes up to date.
+        Start with `?since=0` and pass the returned `next` token on the following request.
+
+        Returns `{"changes": [...], "deleted": [...], "next": "<token>", "more": false}`: the created or modified
+        visible notes in the same format as the list, and the ids of notes that have been hidden or deleted. At most
+        `limit` (max 1000) changes are returned at a time; if `more` is true, request again right away. Supports
+        `fields`, but not the other list filters.
+        """
+        try:
+            since = int(request.query_params.get("since", 0))
+            limit = min(max(int(request.query_params.get("limit", self.max_changes)), 1), self.max_changes)
+        except ValueError:
+            raise ValidationError("since must be a token returned by this endpoint and limit an integer")
+
+        fields = self.get_requested_fields()
+        columns = DictMapDataPointSerializer.columns(fields)
+        columns += [column for column in ["id", "visible", "change_seq"] if column not in columns]
+        notes = (
+            models.MapDataPoint.objects.filter(change_seq__gt=since)
+            .order_by("change_seq")
+            .values(*columns)[: limit + 1]
+        )
+        tombstones = (
+            models.MapDataPointTombstone.objects.filter(change_seq__gt=since)
+            .order_by("change_seq")
+            .values("map_data_point_id", "change_seq")[: limit + 1]
+        )
+        items = sorted([*notes, *tombstones], key=lambda item: item["change_seq"])
+        more = len(items) > limit
+        items = items[:limit]
+
+        serializer = DictMapDataPointSerializer(fields=fields)
+        return Response(
+            {
+                "changes": [serializer.to_representation(item) for item in items if item.get("visible")],
+                "deleted": [item.get("map_data_point_id", item.get("id")) for item in items if not item.get("visible")],
+                "next": str(items[-1]["change_seq"] if items else since),
+                "more": more,
+            }
+        )
+
     @action(methods=["PUT"], detail=True)
     def upvote(self, request, *args, **kwargs):
         map_data_point = self.get_object()
-        map_data_point.upvotes.get_or_create(user=request.user)
-        map_data_point.downvotes.filter(user=request.user).delete()
-        map_data_point = self.get_object()  # Reload from db
+        map_data_point.vote(request.user, upvote=True)
         serializer = self.get_serializer(map_data_point)
         return Response(serializer.data)
 
     @action(methods=["PUT"], detail=True)
     def downvote(self, request, *args, **kwargs):
         map_data_point = self.get_object()
-        map_data_point.downvotes.get_or_create(user=request.user)
-        map_data_point.upvotes.filter(user=request.user).delete()
-        map_data_point = self.get_object()  # Reload from db
+        map_data_point.vote(request.user, upvote=False)
         serializer = self.get_serializer(map_data_point)
         return Response(serializer.data)
 
 
-class MapDataPointCommentsViewSet(viewsets.ModelViewSet):
+class MapDataPointCommentsViewSet(SelectablePaginationMixin, viewsets.ModelViewSet):
     queryset = models.MapDataPointComment.objects.all().select_related("user")
     permission_classes = [permissions.AllowAny]
     serializer_class = MapDataPointCommentSerializer
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = CommentsKeysetPagination
 
     def get_queryset(self):
         if self.request.user.is_anonymous:
@@ -211,11 +509,12 @@ class MapDataPointCommentsViewSet(viewsets.ModelViewSet):
             comment = serializer.save()
         else:
             comment = serializer.save(user=self.request.user)
-        comment.notify_users()
+        # Notifying reviewers and other interested users may take a while, so do it off the request:
+        run_after_commit(notify_comment_users, comment.id)
         return comment
 
 
-class MapDataPointCommentNotificationsViewSet(viewsets.ReadOnlyModelViewSet):
+class MapDataPointCommentNotificationsViewSet(SelectablePaginationMixin, viewsets.ReadOnlyModelViewSet):
     queryset = (
         models.MapDataPointCommentNotification.objects.filter(seen__isnull=True)
         .select_related("comment__user")
@@ -224,6 +523,7 @@ class MapDataPointCommentNotificationsViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
     serializer_class = MapDataPointCommentNotificationSerializer
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = NotificationsKeysetPagination
 
     def get_queryset(self):
         if self.request.user.is_anonymous:
@@ -233,36 +533,100 @@ class MapDataPointCommentNotificationsViewSet(viewsets.ReadOnlyModelViewSet):
     @action(methods=["PUT"], detail=True)
     def mark_seen(self, request, *args, **kwargs):
         notification = self.get_object()
-        if not notification.seen:
-            notification.seen = timezone.now()
-        notification.save()
+        # Only count the notification as read if this request is the one marking it seen, and once that is committed:
+        marked = models.MapDataPointCommentNotification.objects.filter(id=notification.id, seen__isnull=True).update(
+            seen=timezone.now()
+        )
+        if marked:
+            transaction.on_commit(lambda: notification_counts.decrement(notification.user_id))
         return Response("OK")
 
+    @action(methods=["PUT"], detail=False)
+    def mark_all_seen(self, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            return Response({"count": 0})
+        count = models.MapDataPointCommentNotification.objects.filter(user=request.user, seen__isnull=True).update(
+            seen=timezone.now()
+        )
+        notification_counts.reset(request.user.id)
+        return Response({"count": count})
+
+    @action(methods=["GET"], detail=False)
+    def unread_count(self, request, *args, **kwargs):
+        """
+        Number of unseen notifications, e.g. for a badge. Much cheaper to poll than the notifications list.
+        """
+        if request.user.is_anonymous:
+            return Response({"count": 0})
+        return Response({"count": notification_counts.unread_count(request.user.id)})
+
+
+class MapDataPointsGeoJSON(ConditionalListMixin, TileCacheMixin, ListAPIView):
+    """
+    Visible map data points as a GeoJSON FeatureCollection.
+
+    Supports the same `bbox`, `coordinates` and `created_at` / `modified_at` filters as the map data points list,
+    and `fields` to limit the properties of the features.
+
+    Use `stream=true` to have the features read from the db with a server-side cursor and written to the response
+    incrementally, keeping memory use flat regardless of the number of notes.
+
+    Send the ETag of the response back in `If-None-Match` to get an empty 304 Not Modified response if nothing has
+    changed.
+    """
 
-class MapDataPointsGeoJSON(ListAPIView):
     serializer_class = DictMapDataPointSerializer
-    queryset = models.MapDataPoint.objects.filter(visible=True).values()
+    queryset = models.MapDataPoint.objects.filter(visible=True)
     permission_classes = [permissions.AllowAny]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = MapDataPointsFilter
+    stream_chunk_size = 2000
+
+    def get_queryset(self):
+        columns = DictMapDataPointSerializer.columns(self.get_requested_fields())
+        # The coordinates of the features:
+        columns += [column for column in ["lat", "lon"] if column not in columns]
+        return filter_by_location(super().get_queryset(), self.request.query_params).values(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs["fields"] = self.get_requested_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_requested_fields(self):
+        return requested_fields(self.request.query_params, DictMapDataPointSerializer)
+
+    def get_data_version(self):
+        return models.MapDataPoint.latest_change_seq()
 
     def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, self.feature_collection)
+
+    def feature_collection(self, request):
         serializer = self.get_serializer()
+        notes = self.filter_queryset(self.get_queryset())
+        if request.query_params.get("stream") in ["1", "true"]:
+            return StreamingHttpResponse(self.stream_features(notes, serializer), content_type="application/json")
         return Response(
             {
                 "type": "FeatureCollection",
-                "features": [
-                    {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Point",
-                            "coordinates": [note["lon"], note["lat"]],
-                        },
-                        "properties": serializer.to_representation(note),
-                    }
-                    for note in self.get_queryset()
-                ],
+                "features": [note_as_feature(note, serializer) for note in notes],
             }
         )
 
+    def stream_features(self, notes, serializer):
+        yield b'{"type":"FeatureCollection","features":['
+        chunk = []
+        separator = b""
+        for note in notes.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(dumps(note_as_feature(note, serializer)))
+            if len(chunk) >= self.stream_chunk_size:
+                yield separator + b",".join(chunk)
+                chunk = []
+                separator = b","
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield b"]}"
+
 
 class IotDeviceView(APIView):
     """
@@ -291,7 +655,7 @@ class IotDeviceView(APIView):
         lon = convert_deg(int(data.get("longitude")))
         button = int(data.get("button"))
         if button > 0:
-            tags = [t.tag for t in Tag.objects.filter(button_position=button)]
+            tags = tag_registry.tags_at(button)
             if tags:
                 msg, status = "Created", 201
             else:
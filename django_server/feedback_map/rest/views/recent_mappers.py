@@ -1,17 +1,46 @@
 from datetime import timedelta
 
 from django.contrib.auth.models import User
+from django.db.models import Sum
 from django.utils import timezone
 from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from feedback_map.rest.serializers import BaseUserSerializer
+from feedback_map.rest.serializers import RecentMapperSerializer
 
 
 class RecentMappersViewSet(ReadOnlyModelViewSet):
-    serializer_class = BaseUserSerializer
-    queryset = User.objects.filter(created_notes__created_at__gt=timezone.now() - timedelta(days=60)).distinct()
+    """
+    Users who have created map data points during the last `days` days (60 by default, max 365), with the number
+    of notes they created in that time as `note_count`.
+
+    Ordered by `-note_count` by default; you can also order by `[-]note_count` and `[-]username`.
+    """
+
+    serializer_class = RecentMapperSerializer
+    queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ["note_count", "username"]
+    ordering = ["-note_count", "id"]
+
+    default_days = 60
+    max_days = 365
+
+    def get_days(self):
+        try:
+            days = int(self.request.query_params.get("days", self.default_days))
+        except ValueError:
+            raise ValidationError({"days": "Must be an integer."})
+        return min(max(days, 1), self.max_days)
 
     def get_queryset(self):
-        return User.objects.filter(created_notes__created_at__gt=timezone.now() - timedelta(days=60)).distinct()
\ No newline at end of file
+        since = timezone.localdate() - timedelta(days=self.get_days())
+        # Summed from the daily activity aggregates rather than the notes:
+        return (
+            User.objects.filter(mapper_activity__date__gt=since)
+            .annotate(note_count=Sum("mapper_activity__note_count"))
+            .filter(note_count__gt=0)
+        )
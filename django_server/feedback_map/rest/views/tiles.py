@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+MAX_ZOOM = 22
+
+# Properties mirror those produced by DictMapDataPointSerializer. ST_AsMVT leaves out NULL values, which matches the
+# serializer pruning None / [] values. Vector tiles have no array type, so tags are sent as a comma separated string.
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom
+),
+notes AS (
+    SELECT
+        ST_AsMVTGeom(ST_Transform(note.geom, 3857), bounds.geom) AS geom,
+        note.id,
+        note.status,
+        note.comment,
+        %(media_url)s || NULLIF(note.image, '') AS image,
+        note.lat::float8 AS lat,
+        note.lon::float8 AS lon,
+        note.processed_by_id IS NOT NULL AS is_processed,
+        note.created_by_id AS created_by,
+        NULLIF(array_to_string(note.tags, ','), '') AS tags,
+        to_json(note.created_at) #>> '{}' AS created_at,
+        to_json(note.modified_at) #>> '{}' AS modified_at,
+        note.upvote_count,
+        note.downvote_count
+    FROM feedback_map_mapdatapoint note, bounds
+    WHERE note.visible AND note.geom && ST_Transform(bounds.geom, 4326)
+)
+SELECT ST_AsMVT(notes.*, 'map_data_points', 4096, 'geom') FROM notes
+"""
+
+
+class MapDataPointTilesView(APIView):
+    """
+    Visible map data points as Mapbox Vector Tiles, built in PostGIS.
+
+    Tiles use the standard XYZ (slippy map) scheme in Web Mercator and contain a single layer `map_data_points`
+    with the same properties as the GeoJSON export. Tags are encoded as a comma separated string.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, z, x, y):
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+            raise Http404("Invalid tile coordinates")
+        with connection.cursor() as cursor:
+            cursor.execute(TILE_SQL, {"z": z, "x": x, "y": y, "media_url": settings.MEDIA_URL})
+            tile = cursor.fetchone()[0]
+        return HttpResponse(bytes(tile or b""), content_type=MVT_CONTENT_TYPE)
@@ -1,58 +1,92 @@
-import json
-import logging
-import os
-
-from django.core import serializers
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from kafka import KafkaProducer
-
-from feedback_map.models.map_data_points import MapDataPoint
-
-# Create a Kafka producer instance. This will raise an exception if the connection fails.
-# Producer will live for the duration of the app.
-if os.getenv("KAFKA_BOOTSTRAP_SERVERS"):
-    try:
-        producer = KafkaProducer(
-            bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS", "").split(","),
-            security_protocol=os.getenv("KAFKA_SECURITY_PROTOCOL", "PLAINTEXT"),
-            ssl_cafile=os.getenv("KAFKA_SSL_CA_LOCATION"),
-            ssl_certfile=os.getenv("KAFKA_ACCESS_CERT"),
-            ssl_keyfile=os.getenv("KAFKA_ACCESS_KEY"),
-            sasl_mechanism=os.getenv("KAFKA_SASL_MECHANISMS"),
-            sasl_plain_username=os.getenv("KAFKA_SASL_USERNAME"),
-            sasl_plain_password=os.getenv("KAFKA_SASL_PASSWORD"),
-        )
-        logging.info("Kafka producer successfully connected to {}.".format(os.getenv("KAFKA_BOOTSTRAP_SERVERS")))
-    except Exception as e:
-        logging.critical(f"Kafka producer failed to connect. {e}")
-        raise
-else:
-    producer = None
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver, Signal
+
+from feedback_map import forwarding, notification_counts, tile_cache
+from feedback_map.models import MapDataPoint, MapDataPointCommentNotification, MapperActivity, OutboxMessage, Tag
+from feedback_map.tag_registry import tag_registry
+
+# Sent once for a batch of notes created with bulk_create, which does not send post_save. Receivers get the created
+# notes as `instances`.
+map_data_points_bulk_created = Signal()
+
+
+@receiver(post_save, sender=MapDataPoint)
+def enqueue_forwarding(sender, instance, created, **kwargs):
+    """
+    Queue the saved note for forwarding to Kafka and the IoT feedback API. MapDataPoint.save runs in a transaction,
+    so the outbox messages are committed together with the change; the forward_outbox command sends them.
+    """
+    OutboxMessage.objects.bulk_create(forwarding.outbox_messages_for(instance, created))
+
+
+@receiver(map_data_points_bulk_created, sender=MapDataPoint)
+def enqueue_bulk_forwarding(sender, instances, **kwargs):
+    OutboxMessage.objects.bulk_create(
+        [message for instance in instances for message in forwarding.outbox_messages_for(instance, created=True)]
+    )
+
+
+@receiver(post_save, sender=MapDataPoint)
+def record_mapper_activity(sender, instance, created, **kwargs):
+    if created:
+        MapperActivity.record([instance])
+
+
+@receiver(map_data_points_bulk_created, sender=MapDataPoint)
+def record_bulk_mapper_activity(sender, instances, **kwargs):
+    MapperActivity.record(instances)
+
+
+@receiver(post_delete, sender=MapDataPoint)
+def remove_mapper_activity(sender, instance, **kwargs):
+    MapperActivity.record([instance], delta=-1)
 
 
 @receiver(post_save, sender=MapDataPoint)
-def send_to_kafka(sender, instance, created, **kwargs):
-    data = json.loads(serializers.serialize("json", [instance]))[0]
-    # create a dict with the fields we want to send to Kafka
-    keys = ["created_at", "modified_at", "image", "comment", "device_id"]
-    payload = {"id": instance.id}
-    for key in keys:
-        payload[key] = data["fields"][key]
-    for key in ["lat", "lon"]:
-        payload[key] = float(data["fields"][key])
-    payload["tags"] = json.loads(data["fields"]["tags"])
-    import httpx
-
-    httpx.post("https://iot-feedback-api.ecosystem-urbanage.eu/iot/send_data/", json=payload)
-    # convert dict to bytes
-    pl_bytes = json.dumps(payload, sort_keys=True).encode("utf-8")
-    if producer is not None and os.getenv("KAFKA_FORWARD_TOPIC_NAME") and created:
-        # serialize instance to json using Django's serializer, this will take care of datetime and other types
-        logging.info(f"Sending {pl_bytes} to Kafka topic {os.getenv('KAFKA_FORWARD_TOPIC_NAME')}")
-        producer.send(os.getenv("KAFKA_FORWARD_TOPIC_NAME"), pl_bytes)
-        # flush the producer to ensure the message is sent
-        producer.flush()
+@receiver(post_delete, sender=MapDataPoint)
+def invalidate_tile_cache(sender, instance, **kwargs):
+    tile_cache.invalidate_notes([instance])
+
+
+@receiver(map_data_points_bulk_created, sender=MapDataPoint)
+def invalidate_bulk_tile_cache(sender, instances, **kwargs):
+    tile_cache.invalidate_notes(instances)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_registry(sender, **kwargs):
+    # Also after commit, so that nothing loaded before the commit is left with the latest version stamp:
+    tag_registry.invalidate()
+    transaction.on_commit(tag_registry.invalidate)
+
+
+@receiver(post_delete, sender=MapDataPointCommentNotification)
+def invalidate_unread_notification_count(sender, instance, **kwargs):
+    # e.g. when the comment is deleted:
+    notification_counts.invalidate(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_group_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    # Imported here, as importing feedback_map.rest imports this module:
+    from feedback_map.rest.permissions import invalidate_user_group_names
+
+    if action not in ["post_add", "post_remove", "pre_clear"]:
+        return
+    if not reverse:
+        instance.__dict__.pop("_group_names", None)
+        invalidate_user_group_names([instance.pk])
+    elif pk_set is not None:
+        invalidate_user_group_names(pk_set)
     else:
-        logging.info(f"Would send {pl_bytes} to Kafka, but it's not configured.")
-        pass  # new instance was not created, so we don't need to send it to Kafka
+        invalidate_user_group_names(instance.user_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group_membership(sender, instance, **kwargs):
+    from feedback_map.rest.permissions import invalidate_user_group_names
+
+    invalidate_user_group_names(instance.user_set.values_list("id", flat=True))
@@ -0,0 +1,98 @@
+"""
+In-process registry of tags and their button positions, so that serializing and ingesting notes needs no Tag queries.
+
+Each process keeps its own copy of the tags. Changing or deleting a tag bumps a version stamp in the shared cache, and
+every process reloads its copy when it notices that the version has changed. The version is checked at most once per
+TAG_REGISTRY_CHECK_INTERVAL seconds.
+"""
+import time
+import uuid
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class TagSnapshot(NamedTuple):
+    version: str
+    # tag -> button position for published tags with a button position
+    published_positions: dict
+    # button position -> names of all tags with that button position, published or not
+    tags_by_position: dict
+
+
+class TagRegistry:
+    version_key = "feedback_map:tag_registry_version"
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0
+
+    def snapshot(self) -> TagSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is None or now - self._checked_at > settings.TAG_REGISTRY_CHECK_INTERVAL:
+            version = self.version()
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._snapshot = self.load(version)
+            self._checked_at = now
+        return snapshot
+
+    def version(self) -> str:
+        """
+        Return the current version stamp of the tags, shared by all processes.
+        """
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(self.version_key, version, None)
+            version = cache.get(self.version_key, version)
+        return version
+
+    def load(self, version) -> TagSnapshot:
+        from feedback_map.models import Tag
+
+        published_positions = {}
+        tags_by_position = {}
+        for tag, button_position, published in Tag.objects.order_by("tag").values_list(
+            "tag", "button_position", "published"
+        ):
+            if button_position is None:
+                continue
+            tags_by_position.setdefault(button_position, []).append(tag)
+            if published is not None:
+                published_positions[tag] = button_position
+        return TagSnapshot(version, published_positions, tags_by_position)
+
+    def invalidate(self):
+        """
+        Make all processes reload the tags on next use.
+        """
+        self._snapshot = None
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def button_position(self, tags) -> Optional[int]:
+        """
+        Return the button position of the first (by name) published tag among the given tags that has one.
+        """
+        published_positions = self.snapshot().published_positions
+        positions = [published_positions[tag] for tag in sorted(tags) if tag in published_positions]
+        return positions[0] if positions else None
+
+    def published_tag(self, button_position) -> Optional[str]:
+        """
+        Return the name of the published tag at the given button position.
+        """
+        for tag, position in self.snapshot().published_positions.items():
+            if position == button_position:
+                return tag
+        return None
+
+    def tags_at(self, button_position) -> list:
+        """
+        Return the names of all tags at the given button position, published or not.
+        """
+        return self.snapshot().tags_by_position.get(button_position, [])
+
+
+tag_registry = TagRegistry()
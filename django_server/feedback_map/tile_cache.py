@@ -0,0 +1,165 @@
+"""
+Cache of the visible notes per slippy map tile, for serving bbox queries of the list and GeoJSON.
+
+A bbox is snapped to the tiles at TILE_CACHE_ZOOM that cover it. The notes of each tile are cached separately in the
+TILE_CACHE_ALIAS cache, so the overlapping bboxes of panning and zooming share cached tiles, and the missing tiles are
+read with a single query. Saving, voting on or deleting a note invalidates just the tile it is in, and the one it was
+in if it was moved. Cached tiles expire after TILE_CACHE_TTL seconds, which bounds how long changes that bypass the
+invalidation, e.g. with QuerySet.update(), can go unnoticed.
+
+Each tile has a generation stamp, replaced on invalidation, and the notes are cached together with the generation read
+before querying them. Cached notes are only used while their generation is current, so notes read by a query that
+raced with a change are never served once the change has been committed.
+"""
+import math
+import uuid
+from operator import itemgetter
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.core.cache import caches
+from django.db import transaction
+
+from feedback_map.models import MapDataPoint
+
+# Web Mercator, and so the tile grid, ends at these latitudes:
+MAX_LATITUDE = 85.0511287798066
+# Widen the query for missing tiles by this many degrees, in case rounding puts a note just outside of its tile:
+TILE_MARGIN = 1e-7
+# Cached for each note: everything any serializer of the lists may need
+ROW_COLUMNS = [field.attname for field in MapDataPoint._meta.concrete_fields if field.name not in ["geom", "geog"]]
+
+
+def get_cache():
+    return caches[settings.TILE_CACHE_ALIAS]
+
+
+def tile_key(zoom, x, y):
+    return f"feedback_map:tile:{zoom}:{x}:{y}"
+
+
+def generation_key(zoom, x, y):
+    return f"feedback_map:tile_generation:{zoom}:{x}:{y}"
+
+
+def tile_of(lon, lat, zoom) -> tuple:
+    """
+    Return the (x, y) of the tile at the given zoom level containing the given position.
+    """
+    n = 2**zoom
+    lat = math.radians(min(max(float(lat), -MAX_LATITUDE), MAX_LATITUDE))
+    x = int((float(lon) + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x, y, zoom) -> tuple:
+    """
+    Return the (min_lon, min_lat, max_lon, max_lat) of the given tile.
+    """
+    n = 2**zoom
+
+    def lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def notes_in_region(region):
+    """
+    Return the visible notes within or on the border of the given (min_lon, min_lat, max_lon, max_lat) region.
+    """
+    return MapDataPoint.objects.filter(visible=True, geom__intersects=Polygon.from_bbox(region)).values(*ROW_COLUMNS)
+
+
+def fetch_tiles(tiles, zoom) -> dict:
+    """
+    Read the rows of the visible notes in the given tiles from the db with one query, by tile.
+    """
+    bounds = [tile_bounds(x, y, zoom) for x, y in tiles]
+    region = (
+        min(b[0] for b in bounds) - TILE_MARGIN,
+        min(b[1] for b in bounds) - TILE_MARGIN,
+        max(b[2] for b in bounds) + TILE_MARGIN,
+        max(b[3] for b in bounds) + TILE_MARGIN,
+    )
+    rows_by_tile = {tile: [] for tile in tiles}
+    for row in notes_in_region(region):
+        tile = tile_of(row["lon"], row["lat"], zoom)
+        # The region may also span tiles that were cached already
+        if tile in rows_by_tile:
+            rows_by_tile[tile].append(row)
+    return rows_by_tile
+
+
+def notes_in_bbox(bbox) -> Optional[list]:
+    """
+    Return the rows of the visible notes within the given (min_lon, min_lat, max_lon, max_lat) bbox, like filtering
+    with geom__within, ordered by id. Return None if the bbox covers more than TILE_CACHE_MAX_TILES tiles.
+    """
+    zoom = settings.TILE_CACHE_ZOOM
+    min_lon, min_lat, max_lon, max_lat = bbox
+    min_x, max_y = tile_of(min_lon, min_lat, zoom)
+    max_x, min_y = tile_of(max_lon, max_lat, zoom)
+    if (max_x - min_x + 1) * (max_y - min_y + 1) > settings.TILE_CACHE_MAX_TILES:
+        return None
+
+    tiles = [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+    keys = {tile: tile_key(zoom, *tile) for tile in tiles}
+    generation_keys = {tile: generation_key(zoom, *tile) for tile in tiles}
+    cache = get_cache()
+    cached = cache.get_many([*keys.values(), *generation_keys.values()])
+    generations = {}
+    for tile in tiles:
+        generations[tile] = cached.get(generation_keys[tile])
+        if generations[tile] is None:
+            generations[tile] = uuid.uuid4().hex
+            cache.add(generation_keys[tile], generations[tile], None)
+            generations[tile] = cache.get(generation_keys[tile], generations[tile])
+
+    rows_by_tile = {}
+    for tile in tiles:
+        generation, rows = cached.get(keys[tile], (None, None))
+        if generation == generations[tile]:
+            rows_by_tile[tile] = rows
+    missing = [tile for tile in tiles if tile not in rows_by_tile]
+    if missing:
+        # The generations were read before the query, so if a tile has changed meanwhile, its generation has been
+        # replaced and the rows cached here won't be used:
+        fetched = fetch_tiles(missing, zoom)
+        cache.set_many(
+            {keys[tile]: (generations[tile], rows) for tile, rows in fetched.items()}, settings.TILE_CACHE_TTL
+        )
+        rows_by_tile.update(fetched)
+
+    rows = [
+        row
+        for tile in tiles
+        for row in rows_by_tile[tile]
+        if min_lon < float(row["lon"]) < max_lon and min_lat < float(row["lat"]) < max_lat
+    ]
+    return sorted(rows, key=itemgetter("id"))
+
+
+def invalidate_notes(notes):
+    """
+    Invalidate the cached tiles containing the given notes, both where they are and where they were loaded from the
+    db. Tiles are invalidated right away and again once the current transaction commits, so that nothing read before
+    the commit is used.
+    """
+    zoom = settings.TILE_CACHE_ZOOM
+    positions = set()
+    for note in notes:
+        positions.add((note.lon, note.lat))
+        positions.add(getattr(note, "_loaded_position", (None, None)))
+    keys = [
+        generation_key(zoom, *tile_of(lon, lat, zoom)) for lon, lat in positions if lon is not None and lat is not None
+    ]
+    if keys:
+        new_generations(keys)
+        transaction.on_commit(lambda: new_generations(keys))
+
+
+def new_generations(generation_keys):
+    get_cache().set_many({key: uuid.uuid4().hex for key in generation_keys}, None)
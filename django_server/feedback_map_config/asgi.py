@@ -3,6 +3,9 @@ ASGI config for feedback_map project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Besides the Django application, it serves the live feed of note changes at feedback_map.live.LIVE_NOTES_PATH,
+which needs an ASGI server to hold the connections open.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
@@ -13,4 +16,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'feedback_map_config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importing models etc. requires the apps to be set up by get_asgi_application() first
+from feedback_map.live import LIVE_NOTES_PATH, live_notes  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == LIVE_NOTES_PATH:
+        await live_notes(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -14,6 +14,7 @@ import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import sys
+import tempfile
 
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
@@ -60,6 +61,7 @@ if os.environ.get("ELASTIC_SERVICE", False):
     INSTALLED_APPS.append("elasticapm.contrib.django")
 
 MIDDLEWARE = [
+    "feedback_map.middleware.QueryStatsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -151,6 +153,11 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    # Same output as the default JSONRenderer, faster:
+    "DEFAULT_RENDERER_CLASSES": [
+        "feedback_map.rest.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 REST_AUTH_SERIALIZERS = {
@@ -158,34 +165,84 @@ REST_AUTH_SERIALIZERS = {
     "PASSWORD_RESET_SERIALIZER": "feedback_map.rest.serializers.PasswordResetSerializer",
 }
 
-LOG_DB_QUERIES = False
+# The tile cache, the tag registry, group memberships and unread notification counts are invalidated through these
+# caches, so every process serving the app must use the same ones. The default file based caches in CACHE_DIR are
+# shared by the processes of a single host only, given that they all see the same CACHE_DIR: docker-compose mounts a
+# shared volume there. When running on several hosts, point CACHE_BACKEND / CACHE_LOCATION and TILE_CACHE_BACKEND /
+# TILE_CACHE_LOCATION to a cache server shared by all of them, e.g. memcached with
+# django.core.cache.backends.memcached.PyMemcacheCache and pymemcache installed.
+CACHE_DIR = os.environ.get("CACHE_DIR", tempfile.gettempdir())
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", os.path.join(CACHE_DIR, "feedback_map_cache")),
+    },
+    # See feedback_map.tile_cache
+    "tiles": {
+        "BACKEND": os.environ.get("TILE_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("TILE_CACHE_LOCATION", os.path.join(CACHE_DIR, "feedback_map_tile_cache")),
+    },
+}
+
+# Cache of the visible notes per slippy map tile for serving bbox queries, see feedback_map.tile_cache. Bboxes
+# covering more than TILE_CACHE_MAX_TILES tiles at TILE_CACHE_ZOOM are queried from the db directly.
+TILE_CACHE_ALIAS = "tiles"
+TILE_CACHE_ZOOM = int(os.environ.get("TILE_CACHE_ZOOM", 14))
+TILE_CACHE_MAX_TILES = int(os.environ.get("TILE_CACHE_MAX_TILES", 64))
+TILE_CACHE_TTL = int(os.environ.get("TILE_CACHE_TTL", 300))
+
+# Threads per process running work deferred until after commit, e.g. image processing. See feedback_map.background.
+BACKGROUND_TASK_WORKERS = int(os.environ.get("BACKGROUND_TASK_WORKERS", 2))
+
+# Max seconds before a process notices tag changes made by another process, see feedback_map.tag_registry:
+TAG_REGISTRY_CHECK_INTERVAL = float(os.environ.get("TAG_REGISTRY_CHECK_INTERVAL", 1))
+
+# Seconds to share the group memberships of a user between requests, 0 to fetch them on each request:
+GROUP_MEMBERSHIP_CACHE_TTL = int(os.environ.get("GROUP_MEMBERSHIP_CACHE_TTL", 60))
+
+# Seconds to cache the unread notification count of a user:
+UNREAD_NOTIFICATION_COUNT_TTL = int(os.environ.get("UNREAD_NOTIFICATION_COUNT_TTL", 300))
+
+# Log the query count and duration of each request, and queries run more than once per request. In DEBUG mode
+# every query is logged as well.
+LOG_DB_QUERIES = os.environ.get("LOG_DB_QUERIES", "").lower() in ("1", "true", "yes")
+# Add the query count and duration of each request to the response as a Server-Timing header:
+DB_QUERY_SERVER_TIMING = os.environ.get("DB_QUERY_SERVER_TIMING", "1" if DEBUG else "").lower() in ("1", "true", "yes")
 
 if LOG_DB_QUERIES:
     LOGGING = {
         "version": 1,
         "disable_existing_loggers": False,
-        "filters": {
-            "require_debug_true": {
-                "()": "django.utils.log.RequireDebugTrue",
-            }
-        },
         "handlers": {
             "console": {
                 "level": "DEBUG",
-                "filters": ["require_debug_true"],
                 "class": "logging.StreamHandler",
             }
         },
+        "root": {
+            "level": "INFO",
+            "handlers": ["console"],
+        },
         "loggers": {
             "django.db.backends": {
                 "level": "DEBUG",
                 "handlers": ["console"],
+                "propagate": False,
             }
         },
     }
 
 FRONTEND_ROOT = "https://urbanage.fvh.io/"
 
+# Forwarding of new and changed notes, see feedback_map.forwarding. Set IOT_FEEDBACK_API_URL empty to disable.
+IOT_FEEDBACK_API_URL = os.environ.get(
+    "IOT_FEEDBACK_API_URL", "https://iot-feedback-api.ecosystem-urbanage.eu/iot/send_data/"
+)
+FORWARD_TIMEOUT = float(os.environ.get("FORWARD_TIMEOUT", 15))
+OUTBOX_MAX_RETRY_DELAY = int(os.environ.get("OUTBOX_MAX_RETRY_DELAY", 3600))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 20))
+OUTBOX_RETENTION_DAYS = int(os.environ.get("OUTBOX_RETENTION_DAYS", 7))
+
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
 ADMINS = [["FVH Django admins", "django-admins@forumvirium.fi"]]
@@ -219,6 +276,12 @@ except ImportError:
 
 if "test" in sys.argv:
     DEFAULT_FILE_STORAGE = "inmemorystorage.InMemoryStorage"
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "tiles": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tiles"},
+    }
+    # Run deferred work in the test thread, where it can see the test transaction:
+    BACKGROUND_TASK_WORKERS = 0
     TEST = True
     # INMEMORYSTORAGE_PERSIST = True
 else:
@@ -1,21 +1,32 @@
 """
 Consume parsed data messages from Kafka topic and send the data to FVHFeedbackMap rest endpoint using requests.
+
+Set KAFKA2API_ASYNC=1 to consume with aiokafka and upload with a pooled httpx.AsyncClient instead, running up to
+KAFKA2API_CONCURRENCY uploads at a time.
 """
 
+import asyncio
 import datetime
 import logging
 import os
 import time
 from pprint import pformat, pprint
+from collections import defaultdict
 from typing import Tuple, Optional
 from zoneinfo import ZoneInfo
 
+import httpx
 import requests
 
 from fvhiot.utils import init_script
 from fvhiot.utils.data import data_unpack
 from fvhiot.utils.kafka import get_kafka_consumer_by_envs
 
+ALLOWED_DEVICE_IDS = ["FFFF000000000001"]
+API_TOKEN = "api_token_should_be_here"
+USER_AGENT = "iot-device-upload/0.0.1 (https://github.com/ForumViriumHelsinki/FVHFeedbackMap)"
+UPLOAD_RETRIES = 5
+
 sample_data = {
     "data": [
         {
@@ -59,7 +70,7 @@ def upload_to_api(api_url: str, api_token: str, data: dict) -> Tuple[bool, Optio
     """Upload given data to rest API and return requests.Response or None (in the case of exception)."""
     headers = {
         "X-API-TOKEN": api_token,
-        "User-Agent": "iot-device-upload/0.0.1 (https://github.com/ForumViriumHelsinki/FVHFeedbackMap)",
+        "User-Agent": USER_AGENT,
     }
     res = None
     ok = False
@@ -97,11 +108,123 @@ def transform_data(data: dict) -> dict:
         yield data_to_upload
 
 
+def datalines_to_upload(data: dict) -> list:
+    """Return the datalines of an unpacked message transformed for upload, or [] if the message should be skipped."""
+    device_id = data["device"]["device_id"]
+    if device_id not in ALLOWED_DEVICE_IDS:
+        logging.debug(f"Device {device_id} is not in allowed devices, skipping.")
+        return []
+    if len(data["data"]) == 0:
+        logging.info("Got parsed data having no datalines: {}".format(pformat(data)))
+        return []
+    return list(transform_data(data))
+
+
+async def upload_to_api_async(client: httpx.AsyncClient, api_url: str, data: dict) -> bool:
+    """
+    Upload given data to rest API, retrying with exponential backoff on connection errors and 5xx responses.
+    Return True if the API accepted the data, False if it rejected it.
+    """
+    for attempt in range(UPLOAD_RETRIES):
+        try:
+            res = await client.post(api_url, json=data)
+            if 200 <= res.status_code < 300:
+                logging.info(f"Request to {api_url} successful: {res.status_code}")
+                return True
+            if res.status_code < 500:
+                # Retrying will not help, drop the dataline like the synchronous consumer does:
+                logging.warning(f"Request to {api_url} failed: {res.status_code}")
+                logging.info(res.content)
+                return False
+            logging.warning(f"Request to {api_url} failed: {res.status_code}, retrying")
+        except httpx.HTTPError:
+            logging.exception(f"Failed to POST to {api_url}, retrying")
+        await asyncio.sleep(2**attempt)
+    raise RuntimeError(f"Upload to {api_url} failed {UPLOAD_RETRIES} times")
+
+
+async def upload_records(records: list, client: httpx.AsyncClient, api_url: str, semaphore: asyncio.Semaphore):
+    """
+    Upload the datalines of the given Kafka records concurrently, bounded by the semaphore. Datalines from the same
+    device are uploaded one at a time in the order they were received.
+    """
+    by_device = defaultdict(list)
+    for msg in records:
+        data = data_unpack(msg.value)
+        by_device[data["device"]["device_id"]].extend(datalines_to_upload(data))
+
+    async def upload_device_datalines(datalines):
+        for data_to_upload in datalines:
+            logging.debug(pformat(data_to_upload))
+            async with semaphore:
+                ok = await upload_to_api_async(client, api_url, data_to_upload)
+            logging.info(f"Result for upload: {ok}")
+
+    await asyncio.gather(*[upload_device_datalines(datalines) for datalines in by_device.values()])
+
+
+def get_aiokafka_consumer_by_envs(topic: str):
+    from aiokafka import AIOKafkaConsumer
+    from aiokafka.helpers import create_ssl_context
+
+    security_protocol = os.getenv("KAFKA_SECURITY_PROTOCOL", "PLAINTEXT")
+    ssl_context = None
+    if security_protocol in ["SSL", "SASL_SSL"]:
+        ssl_context = create_ssl_context(
+            cafile=os.getenv("KAFKA_SSL_CA_LOCATION"),
+            certfile=os.getenv("KAFKA_ACCESS_CERT"),
+            keyfile=os.getenv("KAFKA_ACCESS_KEY"),
+        )
+    return AIOKafkaConsumer(
+        topic,
+        bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS", "").split(","),
+        group_id=os.getenv("KAFKA_GROUP_ID", "kafka2api"),
+        security_protocol=security_protocol,
+        ssl_context=ssl_context,
+        sasl_mechanism=os.getenv("KAFKA_SASL_MECHANISMS", "PLAIN"),
+        sasl_plain_username=os.getenv("KAFKA_SASL_USERNAME"),
+        sasl_plain_password=os.getenv("KAFKA_SASL_PASSWORD"),
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+    )
+
+
+async def async_main():
+    init_script()
+    parsed_data_topic = os.getenv("KAFKA_PARSED_DATA_TOPIC_NAME")
+    api_url = os.getenv("FVHFEEDBACKMAP_API_URL")
+    concurrency = int(os.getenv("KAFKA2API_CONCURRENCY", 10))
+    consumer = get_aiokafka_consumer_by_envs(parsed_data_topic)
+    try:
+        await consumer.start()
+    except Exception:
+        logging.critical("Kafka connection failed, exiting.")
+        await asyncio.sleep(10)
+        exit(1)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"X-API-TOKEN": API_TOKEN, "User-Agent": USER_AGENT}
+    try:
+        async with httpx.AsyncClient(headers=headers, limits=limits, timeout=15) as client:
+            # Loop forever for incoming messages
+            while True:
+                batches = await consumer.getmany(timeout_ms=1000, max_records=500)
+                records = [msg for partition_records in batches.values() for msg in partition_records]
+                if not records:
+                    continue
+                await upload_records(records, client, api_url, semaphore)
+                # Only commit once the whole batch has been uploaded; a failure above stops the consumer without
+                # committing, so the batch is consumed again after restart.
+                await consumer.commit()
+    finally:
+        await consumer.stop()
+
+
 def main():
     init_script()
     parsed_data_topic = os.getenv("KAFKA_PARSED_DATA_TOPIC_NAME")
     # Create Kafka consumer for incoming raw data messages
-    # TODO: use aiokafka
     consumer = get_kafka_consumer_by_envs(parsed_data_topic)
     api_url = os.getenv("FVHFEEDBACKMAP_API_URL")
     if consumer is None:
@@ -109,24 +232,19 @@ def main():
         time.sleep(10)
         exit(1)
     # Loop forever for incoming messages
-    device_ids = ["FFFF000000000001"]
     for msg in consumer:
         data = data_unpack(msg.value)
-        device_id = data["device"]["device_id"]
-        if device_id not in device_ids:
-            logging.debug(f"Device {device_id} is not in allowed devices, skipping.")
-            continue
-        if len(data["data"]) == 0:
-            logging.info("Got parsed data having no datalines: {}".format(pformat(data)))
-            continue
-        for data_to_upload in transform_data(data):
+        for data_to_upload in datalines_to_upload(data):
             logging.debug(pformat(data_to_upload))
-            ok, res = upload_to_api(api_url, "api_token_should_be_here", data_to_upload)
+            ok, res = upload_to_api(api_url, API_TOKEN, data_to_upload)
             logging.info(f"Result for upload: {ok}, {res}")
 
 
 if __name__ == "__main__":
     try:
-        main()
+        if os.getenv("KAFKA2API_ASYNC"):
+            asyncio.run(async_main())
+        else:
+            main()
     except KeyboardInterrupt:
         print("Bye!")
@@ -33,6 +33,18 @@ server {
         alias /site/urbanage.fvh.io/FVHFeedbackMap/django_server/media/;
     }
 
+    # Live feed of note changes, served by the ASGI server
+    location = /rest/map_data_points/live/ {
+        proxy_pass http://127.0.0.1:8001;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_set_header Host $host;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_buffering off;
+        proxy_read_timeout 1h;
+    }
+
     location ~* ^/(admin|rest|openapi|swagger) {
         proxy_pass http://127.0.0.1:8000;
         proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;